@@ -1,34 +1,48 @@
 from dotenv import load_dotenv
 load_dotenv()  
 
+import logging
+import os
+
+# Configure logging before the app modules are imported so their loggers inherit the level
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(level=LOG_LEVEL)
+
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import ORJSONResponse, Response
 from sqlalchemy.orm import Session
-from app.models.database import SessionLocal, engine, Base, MenuItem, Branch, User, Order
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.database import SessionLocal, engine, Base, MenuItem, Branch, User, Order, POOL_SIZE
+from app.models.database import AsyncSessionLocal, async_engine, init_db
 from app.routers import webhook, admin, voice
 from app.utils.scraper import MenuScraper
-from app.services.whatsapp_service import WhatsAppService
+from app.utils.cache import TTLCache, get_menu_version, bump_menu_version
+from app.services.whatsapp_service import whatsapp_service, close_async_client
+from app.services.location_service import geocode_breaker
 from app.services.voice_service import voice_service
 import uvicorn
-import os
-import traceback
+import time
+import asyncio
+import random
+import orjson
 from datetime import datetime
-from sqlalchemy import inspect
+from sqlalchemy import insert, text, select, func
 
-# Debug: Check if environment variables are loading
-print("🔍 Environment Variables Check:")
-print(f"   GREEN_API_ID: {os.getenv('GREEN_API_ID', 'NOT FOUND')}")
-print(f"   GREEN_API_TOKEN: {os.getenv('GREEN_API_TOKEN', 'NOT FOUND')[:10]}...")  # Show first 10 chars only
-print(f"   DATABASE_URL: {os.getenv('DATABASE_URL', 'sqlite:///./foodexpress.db')}")
+logger = logging.getLogger(__name__)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Debug: Check if environment variables are loading
+logger.info("🔍 Environment Variables Check:")
+logger.info("   GREEN_API_ID: %s", os.getenv('GREEN_API_ID', 'NOT FOUND'))
+logger.info("   GREEN_API_TOKEN: %s...", os.getenv('GREEN_API_TOKEN', 'NOT FOUND')[:10])  # Show first 10 chars only
+logger.info("   DATABASE_URL: %s", os.getenv('DATABASE_URL', 'sqlite:///./foodexpress.db'))
 
 app = FastAPI(
     title="WhatsApp Food Order Chatbot - Pakistan (GREEN-API + Voice)",
     description="AI-powered food ordering system via WhatsApp with GREEN-API Integration & Voice Recognition",
     version="6.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # Include routers
@@ -36,247 +50,413 @@ app.include_router(webhook.router, prefix="/api/v1")
 app.include_router(admin.router, prefix="/api/v1/admin")
 app.include_router(voice.router, prefix="/api/v1/voice")
 
-def check_voice_service_status():
-    """Check voice service status safely"""
+# Short-lived status caches (timestamp, value)
+STATUS_CACHE_TTL = 15  # seconds
+_whatsapp_status_cache = (0.0, None)
+
+# Grouped /menu payload, keyed on the menu version
+MENU_CACHE_TTL = 60  # seconds
+_menu_payload_cache = TTLCache(ttl=MENU_CACHE_TTL, maxsize=1)
+
+# Fixed parts of the / and /api-status bodies - only the live fields are merged in per request
+API_VERSION = "6.0.0"
+_ROOT_STATIC = {
+    "message": "WhatsApp Food Order Chatbot API - GREEN-API & Voice Powered",
+    "status": "running",
+    "database": "SQLite",
+    "currency": "Pakistani Rupees (Rs.)",
+    "languages": "English, Hindi, Roman Urdu, Urdu",
+    "version": API_VERSION,
+    "endpoints": {
+        "docs": "/docs",
+        "health": "/health",
+        "system_health": "/system-health",
+        "whatsapp_health": "/api/v1/whatsapp/health",
+        "voice_support": "/api/v1/voice/voice-supported",
+        "send_test_message": "/api/v1/whatsapp/send-test (POST)",
+        "demo_chat": "/api/v1/demo/chat (POST)",
+        "voice_transcribe": "/api/v1/voice/transcribe (POST)",
+        "menu": "/menu",
+        "stats": "/stats"
+    }
+}
+
+def json_bytes_response(content: dict) -> Response:
+    """Serialize straight to bytes with orjson and skip the response model pipeline"""
+    return Response(content=orjson.dumps(content), media_type="application/json")
+
+def _resolve_voice_status():
+    """Work out which voice backend is active (models are loaded once at import)"""
     try:
-        if hasattr(voice_service, 'asr_pipeline') and voice_service.asr_pipeline:
+        if getattr(voice_service, 'asr_pipeline', None):
             return "HuggingFace Wav2Vec2", True
-        elif hasattr(voice_service, 'whisper_model') and voice_service.whisper_model:
+        elif getattr(voice_service, 'whisper_model', None):
             return "Whisper", True
         else:
             return "Google Speech Recognition", True
     except Exception as e:
-        print(f"❌ Voice service check failed: {e}")
+        logger.error("❌ Voice service check failed: %s", e)
         return "Not Available", False
 
+# The voice backend never changes at runtime, so resolve it once
+_VOICE_STATUS = _resolve_voice_status()
+
+def check_voice_service_status():
+    """Check voice service status safely"""
+    return _VOICE_STATUS
+
+def load_voice_languages():
+    """Get supported voice languages safely"""
+    try:
+        return tuple(voice_service.supported_languages())
+    except Exception:
+        return ("English", "Urdu", "Hindi")
+
 def check_whatsapp_service_status():
-    """Check WhatsApp service status safely"""
+    """Check WhatsApp service status safely (cached for STATUS_CACHE_TTL seconds)"""
+    global _whatsapp_status_cache
+    cached_at, cached_health = _whatsapp_status_cache
+    if cached_health is not None and time.monotonic() - cached_at < STATUS_CACHE_TTL:
+        return cached_health
+    
     try:
-        whatsapp_service = WhatsAppService()
-        return whatsapp_service.check_whatsapp_health()
+        health = whatsapp_service.check_whatsapp_health()
     except Exception as e:
-        print(f"❌ WhatsApp service check failed: {e}")
+        logger.error("❌ WhatsApp service check failed: %s", e)
         return {
             "status": "error",
             "green_api": False,
             "error": str(e)
         }
+    
+    _whatsapp_status_cache = (time.monotonic(), health)
+    return health
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize application on startup - COMPLETELY FIXED VERSION"""
-    print("=" * 70)
-    print("🚀 Starting WhatsApp Food Order Chatbot - Voice Enhanced Edition...")
-    print("=" * 70)
+async def _whatsapp_probe():
+    """WhatsApp status for async handlers; a cache miss makes a blocking HTTP call, so run it in a thread"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, check_whatsapp_service_status)
+
+def load_startup_menu():
+    """Scrape the menu, falling back to the built-in menus (blocking)"""
+    scraper = MenuScraper()
+    menu_data = []
     
+    logger.info("🌐 Attempting to initialize menu...")
     try:
-        # Initialize menu data with better error handling
-        scraper = MenuScraper()
-        menu_data = []
-        
-        print("🌐 Attempting to initialize menu...")
+        # Try scraping first
+        logger.info("   Step 1: Attempting to scrape menu from website...")
+        scraped_data = scraper.scrape_menu()
+        if scraped_data and len(scraped_data) > 0:
+            menu_data = scraped_data
+            logger.info("   ✅ Successfully scraped %s menu items", len(menu_data))
+        else:
+            raise Exception("No data returned from scraper")
+    except Exception as e:
+        logger.warning("   ⚠️ Scraping failed: %s", e)
+        logger.info("   🔧 Falling back to built-in Pakistani menu...")
         try:
-            # Try scraping first
-            print("   Step 1: Attempting to scrape menu from website...")
-            scraped_data = scraper.scrape_menu()
-            if scraped_data and len(scraped_data) > 0:
-                menu_data = scraped_data
-                print(f"   ✅ Successfully scraped {len(menu_data)} menu items")
+            menu_data = scraper.create_pakistani_menu()
+            logger.info("   ✅ Created %s Pakistani menu items", len(menu_data))
+        except Exception as inner_e:
+            logger.error("   ❌ Built-in menu failed: %s", inner_e)
+            logger.info("   🚨 Using emergency fallback menu...")
+            menu_data = scraper.create_emergency_menu()
+            logger.info("   ✅ Created %s emergency menu items", len(menu_data))
+    
+    return menu_data
+
+async def init_whatsapp_service():
+    """Probe GREEN-API with retries and exponential backoff"""
+    logger.info("📱 Initializing WhatsApp Service...")
+    loop = asyncio.get_running_loop()
+    whatsapp_health = None
+    max_retries = 3
+    retry_base_delay = 1.0  # seconds
+    retry_max_delay = 30.0  # seconds
+    for attempt in range(max_retries):
+        try:
+            # The probe is a blocking HTTP call - keep it off the event loop
+            whatsapp_health = await loop.run_in_executor(None, whatsapp_service.check_whatsapp_health)
+            
+            if whatsapp_health.get('green_api'):
+                if whatsapp_health.get('status') == 'connected':
+                    logger.info("   ✅ GREEN-API Connected Successfully!")
+                    logger.info("   📞 WhatsApp State: %s", whatsapp_health.get('whatsapp_state', 'Unknown'))
+                    break
+                else:
+                    logger.info("   🔶 GREEN-API: Attempt %s - Not connected", attempt + 1)
             else:
-                raise Exception("No data returned from scraper")
+                logger.info("   🔶 Attempt %s - Running in DEMO Mode", attempt + 1)
+                break
+                
         except Exception as e:
-            print(f"   ⚠️ Scraping failed: {str(e)}")
-            print("   🔧 Falling back to built-in Pakistani menu...")
-            try:
-                menu_data = scraper.create_pakistani_menu()
-                print(f"   ✅ Created {len(menu_data)} Pakistani menu items")
-            except Exception as inner_e:
-                print(f"   ❌ Built-in menu failed: {inner_e}")
-                print("   🚨 Using emergency fallback menu...")
-                menu_data = scraper.create_emergency_menu()
-                print(f"   ✅ Created {len(menu_data)} emergency menu items")
-        
-        print("✅ Menu initialization completed")
+            logger.warning("   ⚠️ Attempt %s failed: %s", attempt + 1, e)
+            # Bad credentials will not fix themselves - don't retry
+            status_code = getattr(getattr(e, 'response', None), 'status_code', None)
+            if status_code in (401, 403):
+                logger.error("   ❌ GREEN-API rejected credentials. Not retrying.")
+                whatsapp_health = {"status": "demo_mode", "green_api": False}
+                break
+            if attempt < max_retries - 1:
+                # Exponential backoff with jitter, without blocking the event loop
+                delay = min(retry_max_delay, retry_base_delay * (2 ** attempt) * (1 + random.uniform(0, 0.5)))
+                logger.info("   🔄 Retrying in %.1f seconds...", delay)
+                await asyncio.sleep(delay)
+            else:
+                logger.error("   ❌ Max retries reached. WhatsApp service may not be available.")
+                whatsapp_health = {"status": "demo_mode", "green_api": False}
+    
+    return whatsapp_health
+
+def _database_counts_query():
+    """Build one SELECT returning all table counts and order totals"""
+    today = datetime.utcnow().date()
+    start_of_day = datetime(today.year, today.month, today.day)
+    
+    # Scalar subqueries keep each count independent (no cross join between tables)
+    counts = select(
+        select(func.count(MenuItem.id)).scalar_subquery().label("menu_items"),
+        select(func.count(MenuItem.id)).where(MenuItem.is_available == True).scalar_subquery().label("available_menu_items"),
+        select(func.count(Branch.id)).scalar_subquery().label("branches"),
+        select(func.count(Branch.id)).where(Branch.is_active == True).scalar_subquery().label("active_branches"),
+        select(func.count(User.id)).scalar_subquery().label("users"),
+        select(func.count(Order.id)).scalar_subquery().label("orders"),
+        select(func.count(Order.id)).where(Order.created_at >= start_of_day).scalar_subquery().label("today_orders"),
+        select(func.coalesce(func.sum(Order.total_amount), 0)).scalar_subquery().label("total_revenue")
+    )
+    return counts
+
+def get_database_counts(db: Session) -> dict:
+    """Fetch all table counts and order totals in a single round-trip"""
+    return dict(db.execute(_database_counts_query()).one()._mapping)
+
+async def get_database_counts_async(db: AsyncSession) -> dict:
+    """Async variant of get_database_counts"""
+    result = await db.execute(_database_counts_query())
+    return dict(result.one()._mapping)
+
+def _ping_database():
+    """Check out one pooled connection and run a trivial query"""
+    with engine.connect() as connection:
+        return connection.scalar(text("SELECT 1"))
+
+async def _ping_database_async():
+    """Async variant of _ping_database using the async engine"""
+    async with async_engine.connect() as connection:
+        return await connection.scalar(text("SELECT 1"))
+
+async def warm_connection_pool():
+    """Open a few pooled connections up front so the first requests don't pay connect cost"""
+    warm_count = min(POOL_SIZE, 5)
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(None, _ping_database) for _ in range(warm_count)),
+        return_exceptions=True
+    )
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    if failed:
+        logger.warning("   ⚠️ Connection pool warm-up: %s/%s connections failed", failed, warm_count)
+    else:
+        logger.info("   🔥 Connection pool warmed with %s connections", warm_count)
+
+def build_routes_cache():
+    """List every registered route for /api-status"""
+    routes = []
+    for route in app.routes:
+        if hasattr(route, "methods") and hasattr(route, "path"):
+            routes.append({
+                "path": route.path,
+                "methods": list(route.methods) if route.methods else [],
+                "name": route.name if hasattr(route, "name") else "unnamed"
+            })
+    return routes
+
+def build_api_status_static(routes):
+    """Fixed part of the /api-status body"""
+    return {
+        "api_name": "WhatsApp Food Order Chatbot API",
+        "version": API_VERSION,
+        "total_endpoints": len(routes),
+        "endpoints": routes
+    }
+
+@app.on_event("startup")
+async def startup_event():
+    """Initialize application on startup - COMPLETELY FIXED VERSION"""
+    logger.info("=" * 70)
+    logger.info("🚀 Starting WhatsApp Food Order Chatbot - Voice Enhanced Edition...")
+    logger.info("=" * 70)
+    
+    # All routers are included by now - build the /api-status route list once
+    app.state.routes_cache = build_routes_cache()
+    app.state.api_status_static = build_api_status_static(app.state.routes_cache)
+    
+    try:
+        # Menu scraping, WhatsApp probe and voice check are independent - run them concurrently
+        logger.info("🌐 Initializing menu, WhatsApp and voice services concurrently...")
+        loop = asyncio.get_running_loop()
+        menu_result, whatsapp_result, voice_result = await asyncio.gather(
+            loop.run_in_executor(None, load_startup_menu),
+            init_whatsapp_service(),
+            loop.run_in_executor(None, check_voice_service_status),
+            return_exceptions=True
+        )
+        
+        if isinstance(menu_result, Exception):
+            logger.error("   ❌ Menu initialization failed: %s", menu_result)
+            logger.info("   🚨 Using emergency fallback menu...")
+            menu_data = MenuScraper().create_emergency_menu()
+        else:
+            menu_data = menu_result
+        logger.info("✅ Menu initialization completed")
         
-        # Initialize WhatsApp Service with retry logic
-        print("\n📱 Initializing WhatsApp Service...")
-        whatsapp_health = None
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                whatsapp_service = WhatsAppService()
-                whatsapp_health = whatsapp_service.check_whatsapp_health()
-                
-                if whatsapp_health.get('green_api'):
-                    if whatsapp_health.get('status') == 'connected':
-                        print("   ✅ GREEN-API Connected Successfully!")
-                        print(f"   📞 WhatsApp State: {whatsapp_health.get('whatsapp_state', 'Unknown')}")
-                        break
-                    else:
-                        print(f"   🔶 GREEN-API: Attempt {attempt + 1} - Not connected")
-                else:
-                    print(f"   🔶 Attempt {attempt + 1} - Running in DEMO Mode")
-                    break
-                    
-            except Exception as e:
-                print(f"   ⚠️ Attempt {attempt + 1} failed: {str(e)}")
-                if attempt < max_retries - 1:
-                    print("   🔄 Retrying in 2 seconds...")
-                    import time
-                    time.sleep(2)
-                else:
-                    print("   ❌ Max retries reached. WhatsApp service may not be available.")
-                    whatsapp_health = {"status": "demo_mode", "green_api": False}
+        if isinstance(whatsapp_result, Exception):
+            logger.error("   ❌ WhatsApp initialization failed: %s", whatsapp_result)
+            whatsapp_health = {"status": "demo_mode", "green_api": False}
+        else:
+            whatsapp_health = whatsapp_result or {"status": "demo_mode", "green_api": False}
         
         # Voice service status - FIXED: Using safe check
-        print("\n🎤 Initializing Voice Service...")
-        voice_model, voice_loaded = check_voice_service_status()
+        logger.info("🎤 Initializing Voice Service...")
+        if isinstance(voice_result, Exception):
+            voice_model, voice_loaded = "Not Available", False
+        else:
+            voice_model, voice_loaded = voice_result
         if voice_loaded:
-            print(f"   ✅ {voice_model}: Active")
+            logger.info("   ✅ %s: Active", voice_model)
         else:
-            print(f"   🔶 {voice_model}: Active (Fallback)")
+            logger.info("   🔶 %s: Active (Fallback)", voice_model)
         
-        try:
-            languages = voice_service.supported_languages()
-            print(f"   🌍 Supported Languages: {', '.join(languages)}")
-        except:
-            print("   🌍 Supported Languages: English, Urdu, Hindi")
+        # Supported languages are static - resolve once for /voice-demo
+        app.state.voice_languages = load_voice_languages()
+        logger.info("   🌍 Supported Languages: %s", ', '.join(app.state.voice_languages))
         
         # Verify database data with better error handling - COMPLETELY FIXED
-        print("\n📊 Verifying Database...")
+        logger.info("📊 Verifying Database...")
         db = None
         try:
-            db = SessionLocal()
+            # Schema setup (missing tables/indexes only) - set RUN_MIGRATIONS=0 on workers that shouldn't touch DDL
+            if os.getenv("RUN_MIGRATIONS", "1") == "1":
+                created_tables = init_db()
+                if created_tables:
+                    logger.info("   ✅ Created missing tables: %s", ', '.join(created_tables))
             
-            # Check if tables exist using SQLAlchemy inspect
-            inspector = inspect(db.bind)
-            table_names = inspector.get_table_names()
+            db = SessionLocal()
             
-            if 'menu_items' not in table_names:
-                print("   ⚠️ Tables not created yet. Creating tables...")
-                Base.metadata.create_all(bind=engine)
-                print("   ✅ Tables created successfully")
+            await warm_connection_pool()
             
             # Now tables should exist, check counts - REMOVED DUPLICATE IMPORTS
-            menu_count = db.query(MenuItem).count()
-            branch_count = db.query(Branch).count()
-            user_count = db.query(User).count()
-            order_count = db.query(Order).count()
+            counts = get_database_counts(db)
+            menu_count = counts["menu_items"]
+            branch_count = counts["branches"]
+            user_count = counts["users"]
+            order_count = counts["orders"]
             
             # If no menu items, insert the menu data - FIXED: Use MenuItem already imported at top
             if menu_count == 0:
-                print("   ℹ️ No menu items found. Inserting default menu...")
+                logger.info("   ℹ️ No menu items found. Inserting default menu...")
                 
-                for item_data in menu_data:
-                    menu_item = MenuItem(
-                        name=item_data.get('name', 'Unknown Item'),
-                        price=item_data.get('price', 0),
-                        category=item_data.get('category', 'Other'),
-                        description=item_data.get('description', ''),
-                        is_available=True
-                    )
-                    db.add(menu_item)
+                # Single multi-row INSERT instead of per-object ORM adds
+                menu_rows = [
+                    {
+                        "name": item_data.get('name', 'Unknown Item'),
+                        "price": item_data.get('price', 0),
+                        "category": item_data.get('category', 'Other'),
+                        "description": item_data.get('description', ''),
+                        "is_available": True
+                    }
+                    for item_data in menu_data
+                ]
                 
                 try:
+                    if menu_rows:
+                        db.execute(insert(MenuItem), menu_rows)
                     db.commit()
+                    bump_menu_version()
                     # Re-query to get updated count
                     menu_count = db.query(MenuItem).count()
-                    print(f"   ✅ Inserted {menu_count} menu items")
+                    logger.info("   ✅ Inserted %s menu items", menu_count)
                 except Exception as commit_error:
-                    print(f"   ❌ Failed to commit menu items: {commit_error}")
+                    logger.error("   ❌ Failed to commit menu items: %s", commit_error)
                     db.rollback()
             
-            print("   ✅ Database Verified:")
-            print(f"      • Menu Items: {menu_count}")
-            print(f"      • Branches: {branch_count}")
-            print(f"      • Users: {user_count}")
-            print(f"      • Orders: {order_count}")
-            print(f"      • Currency: Pakistani Rupees (Rs.)")
-            print(f"      • WhatsApp: {'GREEN-API' if whatsapp_health.get('green_api', False) else 'DEMO'}")
-            print(f"      • Voice: {voice_model}")
+            logger.info("   ✅ Database Verified:")
+            logger.info("      • Menu Items: %s", menu_count)
+            logger.info("      • Branches: %s", branch_count)
+            logger.info("      • Users: %s", user_count)
+            logger.info("      • Orders: %s", order_count)
+            logger.info("      • Currency: Pakistani Rupees (Rs.)")
+            logger.info("      • WhatsApp: %s", 'GREEN-API' if whatsapp_health.get('green_api', False) else 'DEMO')
+            logger.info("      • Voice: %s", voice_model)
             
             # Show sample menu items
             if menu_count > 0:
-                sample_items = db.query(MenuItem).limit(5).all()
+                sample_items = db.execute(select(MenuItem.name, MenuItem.price).limit(5)).all()
                 if sample_items:
-                    print(f"      🍽️  Sample Menu:")
+                    logger.info("      🍽️  Sample Menu:")
                     for item in sample_items:
-                        print(f"        • {item.name} - Rs. {item.price:,.0f}")
+                        logger.info("        • %s - Rs. %s", item.name, format(item.price, ",.0f"))
             else:
-                print("      ⚠️ No menu items in database")
+                logger.warning("      ⚠️ No menu items in database")
             
         except Exception as db_error:
-            print(f"   ❌ Database error: {str(db_error)}")
-            print("   ⚠️ Database operations may be limited")
-            import traceback
-            traceback.print_exc()
+            logger.error("   ❌ Database error: %s", db_error)
+            logger.warning("   ⚠️ Database operations may be limited", exc_info=True)
         finally:
             if db:
                 db.close()
         
-        print("\n" + "=" * 70)
-        print("✅ Application startup completed successfully!")
-        print("=" * 70)
-        print("\n🌐 Server running at: http://localhost:8000")
-        print("📚 API Documentation: http://localhost:8000/docs")
-        print("💬 Demo Chat: POST /api/v1/demo/chat")
-        print("🎤 Voice Test: POST /api/v1/voice/transcribe")
-        print("📱 WhatsApp Test: POST /api/v1/whatsapp/send-test")
-        print("❤️  Health Check: GET /health")
-        print("📊 System Health: GET /system-health")
-        print("🎵 Voice Support: GET /api/v1/voice/voice-supported")
-        print("💻 Streamlit Demo: http://localhost:8501")
-        print("\n🔧 Troubleshooting:")
-        print("   • If WhatsApp not working: Check GREEN-API credentials")
-        print("   • If voice not working: Check internet connection for model download")
-        print("   • If database issues: Check DATABASE_URL in .env file")
-        print("=" * 70)
+        logger.info("=" * 70)
+        logger.info("✅ Application startup completed successfully!")
+        logger.info("=" * 70)
+        logger.info("🌐 Server running at: http://localhost:8000")
+        logger.info("📚 API Documentation: http://localhost:8000/docs")
+        logger.info("💬 Demo Chat: POST /api/v1/demo/chat")
+        logger.info("🎤 Voice Test: POST /api/v1/voice/transcribe")
+        logger.info("📱 WhatsApp Test: POST /api/v1/whatsapp/send-test")
+        logger.info("❤️  Health Check: GET /health")
+        logger.info("📊 System Health: GET /system-health")
+        logger.info("🎵 Voice Support: GET /api/v1/voice/voice-supported")
+        logger.info("💻 Streamlit Demo: http://localhost:8501")
+        logger.info("🔧 Troubleshooting:")
+        logger.info("   • If WhatsApp not working: Check GREEN-API credentials")
+        logger.info("   • If voice not working: Check internet connection for model download")
+        logger.info("   • If database issues: Check DATABASE_URL in .env file")
+        logger.info("=" * 70)
         
     except Exception as e:
-        print(f"\n❌ Fatal error during startup: {str(e)}")
-        print("Stack trace:")
-        traceback.print_exc()
-        print("\n⚠️ Application started with errors. Some features may not work.")
-        print("🔧 Please check the error messages above and fix the issues.")
+        logger.error("❌ Fatal error during startup: %s", e)
+        logger.exception("Stack trace:")
+        logger.warning("⚠️ Application started with errors. Some features may not work.")
+        logger.info("🔧 Please check the error messages above and fix the issues.")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared outbound HTTP connections"""
+    await close_async_client()
 
 @app.get("/")
 async def root():
     """Root endpoint with basic API information"""
     try:
-        whatsapp_health = check_whatsapp_service_status()
+        whatsapp_health = await _whatsapp_probe()
         voice_model, voice_loaded = check_voice_service_status()
         
-        return {
-            "message": "WhatsApp Food Order Chatbot API - GREEN-API & Voice Powered", 
-            "status": "running",
-            "database": "SQLite",
-            "currency": "Pakistani Rupees (Rs.)",
+        return json_bytes_response({
+            **_ROOT_STATIC,
             "whatsapp_service": "GREEN-API" if whatsapp_health.get('green_api') else "DEMO",
             "whatsapp_status": whatsapp_health.get('status', 'unknown'),
             "voice_service": voice_model,
             "voice_status": "active" if voice_loaded else "limited",
-            "languages": "English, Hindi, Roman Urdu, Urdu",
-            "version": "6.0.0",
-            "timestamp": datetime.utcnow().isoformat(),
-            "endpoints": {
-                "docs": "/docs",
-                "health": "/health", 
-                "system_health": "/system-health",
-                "whatsapp_health": "/api/v1/whatsapp/health",
-                "voice_support": "/api/v1/voice/voice-supported",
-                "send_test_message": "/api/v1/whatsapp/send-test (POST)",
-                "demo_chat": "/api/v1/demo/chat (POST)",
-                "voice_transcribe": "/api/v1/voice/transcribe (POST)",
-                "menu": "/menu",
-                "stats": "/stats"
-            }
-        }
+            "timestamp": datetime.utcnow()
+        })
     except Exception as e:
         return {
             "message": "API Service",
             "status": "running",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
 
 @app.get("/health")
@@ -284,24 +464,19 @@ async def health_check():
     """Simple health check endpoint for basic connectivity"""
     try:
         # Test database connection with proper error handling
-        db = None
         db_status = "disconnected"
         db_error_msg = None
         
         try:
-            db = SessionLocal()
-            # Simple query to test connection
-            db.execute("SELECT 1")
+            # Ping straight through the engine - no ORM session needed
+            await _ping_database_async()
             db_status = "connected"
         except Exception as db_error:
             db_status = "disconnected"
             db_error_msg = str(db_error)
-        finally:
-            if db:
-                db.close()
         
         # Check WhatsApp service
-        whatsapp_health = check_whatsapp_service_status()
+        whatsapp_health = await _whatsapp_probe()
         
         # Check voice service
         voice_model, voice_loaded = check_voice_service_status()
@@ -311,10 +486,14 @@ async def health_check():
         response = {
             "status": status,
             "service": "whatsapp-food-order",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "database": db_status,
             "whatsapp": whatsapp_health.get('status', 'unknown'),
             "voice": voice_model,
+            "circuit_breakers": {
+                breaker.name: breaker.state
+                for breaker in (whatsapp_service.health_breaker, whatsapp_service.send_breaker, geocode_breaker)
+            },
             "version": "6.0.0"
         }
         
@@ -328,44 +507,40 @@ async def health_check():
         return {
             "status": "unhealthy",
             "service": "whatsapp-food-order",
-            "timestamp": datetime.utcnow().isoformat(), 
+            "timestamp": datetime.utcnow(), 
             "error": str(e)
         }
 
+async def _db_probe():
+    """Database status and counts for /system-health"""
+    try:
+        async with AsyncSessionLocal() as db:
+            counts = await get_database_counts_async(db)
+        return "connected", counts
+    except Exception as e:
+        return f"error: {str(e)}", {}
+
+async def _voice_probe():
+    """Voice status for /system-health"""
+    voice_model, voice_loaded = check_voice_service_status()
+    return {
+        "model": voice_model,
+        "loaded": voice_loaded,
+        "status": "active" if voice_loaded else "limited"
+    }
+
 @app.get("/system-health")
 async def system_health_check():
     """Comprehensive system health check"""
     try:
-        # Test database
-        db = None
-        db_status = "unknown"
-        menu_count = 0
-        branch_count = 0
-        user_count = 0
-        
-        try:
-            db = SessionLocal()
-            db.execute("SELECT 1")
-            db_status = "connected"
-            menu_count = db.query(MenuItem).count()
-            branch_count = db.query(Branch).count()
-            user_count = db.query(User).count()
-        except Exception as e:
-            db_status = f"error: {str(e)}"
-        finally:
-            if db:
-                db.close()
-        
-        # Check WhatsApp service
-        whatsapp_health = check_whatsapp_service_status()
-        
-        # Check voice service
-        voice_model, voice_loaded = check_voice_service_status()
-        voice_health = {
-            "model": voice_model,
-            "loaded": voice_loaded,
-            "status": "active" if voice_loaded else "limited"
-        }
+        # Probe database, WhatsApp and voice concurrently
+        (db_status, counts), whatsapp_health, voice_health = await asyncio.gather(
+            _db_probe(), _whatsapp_probe(), _voice_probe()
+        )
+        menu_count = counts.get("menu_items", 0)
+        branch_count = counts.get("branches", 0)
+        user_count = counts.get("users", 0)
+        voice_loaded = voice_health["loaded"]
         
         # Determine overall status
         overall_status = "healthy"
@@ -378,7 +553,7 @@ async def system_health_check():
         
         return {
             "status": overall_status,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "components": {
                 "database": {
                     "status": db_status,
@@ -400,7 +575,7 @@ async def system_health_check():
     except Exception as e:
         return {
             "status": "unhealthy",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "error": str(e)
         }
 
@@ -409,22 +584,26 @@ async def test_database():
     """Test database connection and data"""
     try:
         db = SessionLocal()
-        menu_count = db.query(MenuItem).count()
-        branch_count = db.query(Branch).count()
-        user_count = db.query(User).count()
-        order_count = db.query(Order).count()
-        
-        # Get all menu items
-        menu_items = db.query(MenuItem).all()
+        counts = get_database_counts(db)
+        menu_count = counts["menu_items"]
+        branch_count = counts["branches"]
+        user_count = counts["users"]
+        order_count = counts["orders"]
+        
+        # Only the first 10 menu items are shown - fetch just those columns and rows
+        menu_rows = db.execute(
+            select(MenuItem.id, MenuItem.name, MenuItem.price, MenuItem.category, MenuItem.is_available)
+            .limit(10)
+        ).all()
         menu_data = [
             {
-                "id": item.id,
-                "name": item.name,
-                "price": f"Rs. {item.price:,.0f}",
-                "category": item.category,
-                "available": item.is_available
+                "id": row.id,
+                "name": row.name,
+                "price": f"Rs. {row.price:,.0f}",
+                "category": row.category,
+                "available": row.is_available
             }
-            for item in menu_items
+            for row in menu_rows
         ]
         
         db.close()
@@ -444,90 +623,100 @@ async def test_database():
                 "users": user_count,
                 "orders": order_count
             },
-            "menu": menu_data[:10],  # Show first 10 items only
-            "timestamp": datetime.utcnow().isoformat()
+            "menu": menu_data,  # First 10 items only
+            "timestamp": datetime.utcnow()
         }
     except Exception as e:
         return {
             "error": str(e), 
             "status": "database_error",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
 
+async def build_menu_payload() -> dict:
+    """Query available menu items and group them by category"""
+    async with AsyncSessionLocal() as db:
+        # Plain rows instead of ORM instances - nothing here is written back
+        result = await db.execute(
+            select(
+                MenuItem.id, MenuItem.name, MenuItem.price, MenuItem.category,
+                MenuItem.description, MenuItem.is_available
+            ).where(MenuItem.is_available == True)
+        )
+        menu_items = result.all()
+    
+    # Group by category
+    menu_by_category = {}
+    for item in menu_items:
+        category = item.category or "Other"
+        if category not in menu_by_category:
+            menu_by_category[category] = []
+        menu_by_category[category].append({
+            "id": item.id,
+            "name": item.name,
+            "price": item.price,
+            "formatted_price": f"Rs. {item.price:,.0f}",
+            "description": item.description or "",
+            "available": item.is_available
+        })
+    
+    return {
+        "total_items": len(menu_items),
+        "menu_by_category": menu_by_category,
+        "categories": list(menu_by_category.keys())
+    }
+
+async def get_cached_menu_payload() -> dict:
+    """Return the menu payload, rebuilding it when the menu version changes or the TTL expires"""
+    menu_version = get_menu_version()
+    payload = _menu_payload_cache.get(menu_version)
+    if payload is None:
+        payload = await build_menu_payload()
+        _menu_payload_cache.set(menu_version, payload)
+    return payload
+
 @app.get("/menu")
 async def get_full_menu():
     """Get complete menu with better error handling"""
     try:
-        db = SessionLocal()
-        menu_items = db.query(MenuItem).filter(MenuItem.is_available == True).all()
-        
-        # Group by category
-        menu_by_category = {}
-        for item in menu_items:
-            category = item.category or "Other"
-            if category not in menu_by_category:
-                menu_by_category[category] = []
-            menu_by_category[category].append({
-                "id": item.id,
-                "name": item.name,
-                "price": item.price,
-                "formatted_price": f"Rs. {item.price:,.0f}",
-                "description": item.description or "",
-                "available": item.is_available
-            })
-        
-        db.close()
+        menu_payload = await get_cached_menu_payload()
         
         voice_model, voice_loaded = check_voice_service_status()
         
         return {
             "currency": "Pakistani Rupees",
-            "total_items": len(menu_items),
+            "total_items": menu_payload["total_items"],
             "voice_support": True,
             "voice_model": voice_model,
-            "menu_by_category": menu_by_category,
-            "categories": list(menu_by_category.keys()),
-            "timestamp": datetime.utcnow().isoformat()
+            "menu_by_category": menu_payload["menu_by_category"],
+            "categories": menu_payload["categories"],
+            "timestamp": datetime.utcnow()
         }
     except Exception as e:
         return {
             "error": str(e),
             "message": "Failed to fetch menu",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
 
 @app.get("/stats")
 async def get_system_stats():
     """Get system statistics with error handling"""
     try:
-        db = SessionLocal()
-        
-        menu_count = db.query(MenuItem).count()
-        branch_count = db.query(Branch).count()
-        user_count = db.query(User).count()
-        order_count = db.query(Order).count()
-        
-        # Get available menu items
-        available_menu_count = db.query(MenuItem).filter(MenuItem.is_available == True).count()
-        
-        # Get active branches
-        active_branches_count = db.query(Branch).filter(Branch.is_active == True).count()
-        
-        # Get today's date
-        today = datetime.utcnow().date()
-        
-        # Get today's orders
-        today_orders_count = db.query(Order).filter(
-            Order.created_at >= datetime(today.year, today.month, today.day)
-        ).count()
-        
-        # Get total revenue
-        total_revenue = db.query(db.func.sum(Order.total_amount)).scalar() or 0
-        
-        db.close()
+        # All counts and the revenue total in one query
+        async with AsyncSessionLocal() as db:
+            counts = await get_database_counts_async(db)
+        menu_count = counts["menu_items"]
+        branch_count = counts["branches"]
+        user_count = counts["users"]
+        order_count = counts["orders"]
+        available_menu_count = counts["available_menu_items"]
+        active_branches_count = counts["active_branches"]
+        today_orders_count = counts["today_orders"]
+        total_revenue = counts["total_revenue"] or 0
         
         voice_model, voice_loaded = check_voice_service_status()
-        whatsapp_health = check_whatsapp_service_status()
+        whatsapp_health = await _whatsapp_probe()
         
         return {
             "statistics": {
@@ -561,13 +750,13 @@ async def get_system_stats():
                 }
             },
             "currency": "Pakistani Rupees",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
     except Exception as e:
         return {
             "error": str(e),
             "message": "Failed to fetch statistics",
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
 
 @app.get("/voice-demo")
@@ -576,11 +765,10 @@ async def voice_demo_info():
     try:
         voice_model, voice_loaded = check_voice_service_status()
         
-        # Get supported languages safely
-        try:
-            languages = voice_service.supported_languages()
-        except:
-            languages = ["English", "Urdu", "Hindi"]
+        # Supported languages are resolved once at startup
+        languages = getattr(app.state, "voice_languages", None)
+        if languages is None:
+            languages = app.state.voice_languages = load_voice_languages()
         
         return {
             "voice_service": "Active",
@@ -599,53 +787,47 @@ async def voice_demo_info():
                 "whatsapp": "Voice messages automatically processed"
             },
             "languages": languages,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
     except Exception as e:
         return {
             "voice_service": "Limited",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
 
 @app.get("/api-status")
 async def api_status():
     """Get API status and all available endpoints"""
     try:
-        # Get all routes
-        routes = []
-        for route in app.routes:
-            if hasattr(route, "methods") and hasattr(route, "path"):
-                routes.append({
-                    "path": route.path,
-                    "methods": list(route.methods) if route.methods else [],
-                    "name": route.name if hasattr(route, "name") else "unnamed"
-                })
+        # Routes are fixed once the app has started - use the list built at startup
+        static = getattr(app.state, "api_status_static", None)
+        if static is None:
+            app.state.routes_cache = build_routes_cache()
+            static = app.state.api_status_static = build_api_status_static(app.state.routes_cache)
         
-        # System health
+        # System health (reuses the cached WhatsApp/voice statuses)
         system_health = await system_health_check()
         
-        return {
-            "api_name": "WhatsApp Food Order Chatbot API",
-            "version": "6.0.0",
+        return json_bytes_response({
+            **static,
             "status": system_health.get("status", "unknown"),
-            "timestamp": datetime.utcnow().isoformat(),
-            "total_endpoints": len(routes),
-            "endpoints": routes,
+            "timestamp": datetime.utcnow(),
             "system": system_health
-        }
+        })
     except Exception as e:
         return {
             "api_name": "WhatsApp Food Order Chatbot API",
             "status": "error",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
 
 if __name__ == "__main__":
-    print("🚀 Starting server directly (not recommended for production)...")
-    print("📝 Use: uvicorn app.main:app --reload --host 0.0.0.0 --port 8000")
-    print("💡 Tip: Run with --reload flag for development")
+    logger.info("🚀 Starting server directly (not recommended for production)...")
+    logger.info("📝 Use: uvicorn app.main:app --reload --host 0.0.0.0 --port 8000")
+    logger.info("💡 Tip: Run with --reload flag for development")
+    logger.info("⚡ Production: uvicorn app.main:app --loop uvloop --http httptools (single worker)")
     
     # Parse command line arguments if any
     import sys
@@ -665,7 +847,8 @@ if __name__ == "__main__":
         elif arg == "--reload":
             reload = True
     
-    print(f"🌐 Starting on: http://{host}:{port}")
-    print(f"🔄 Reload: {'Enabled' if reload else 'Disabled'}")
+    logger.info("🌐 Starting on: http://%s:%s", host, port)
+    logger.info("🔄 Reload: %s", 'Enabled' if reload else 'Disabled')
     
-    uvicorn.run("app.main:app", host=host, port=port, reload=reload)
\ No newline at end of file
+    # "auto" picks uvloop/httptools when installed (uvicorn[standard]) and falls back to asyncio/h11
+    uvicorn.run("app.main:app", host=host, port=port, reload=reload, loop="auto", http="auto", log_level=LOG_LEVEL.lower())
\ No newline at end of file
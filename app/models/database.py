@@ -1,17 +1,91 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import create_engine, event, inspect, insert, Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from datetime import datetime
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # SQLite Database Configuration
 DATABASE_URL = "sqlite:///./whatsapp_food.db"
 
-# SQLite requires check_same_thread=False
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Connection pool settings - connections are reused across requests and
+# validated on checkout so stale connections never reach a handler
+POOL_SIZE = 20
+MAX_OVERFLOW = 10
+POOL_TIMEOUT = 30  # seconds to wait for a free connection
+POOL_RECYCLE = 1800  # seconds before a connection is replaced
+
+# SQLite requires check_same_thread=False so pooled connections can move between
+# FastAPI's worker threads. The pool class is pinned so connections (and their
+# PRAGMAs) are always reused rather than depending on the dialect default.
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT,
+    pool_pre_ping=True,
+    pool_recycle=POOL_RECYCLE,
+    insertmanyvalues_page_size=1000
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Per-connection SQLite tuning: WAL lets menu reads run alongside order/conversation
+# writes, and synchronous=NORMAL drops the fsync on every commit
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Run the tuning PRAGMAs on every new pooled connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+event.listen(engine, "connect", _apply_sqlite_pragmas)
+
+# Async engine for read-heavy endpoints so DB waits don't block the event loop.
+# aiosqlite defaults to NullPool for file databases, so request a real pool explicitly.
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./whatsapp_food.db"
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT,
+    pool_pre_ping=True,
+    pool_recycle=POOL_RECYCLE
+)
+event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+def get_db():
+    """Yield a Session for the request and close it afterwards - shared by all routers"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    """Yield an AsyncSession for async endpoints"""
+    async with AsyncSessionLocal() as session:
+        yield session
+
 class User(Base):
     __tablename__ = "users"
     
@@ -54,7 +128,7 @@ class Order(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     branch_id = Column(Integer, ForeignKey("branches.id"), nullable=True)  # Fixed: added nullable=True
     total_amount = Column(Float)
-    status = Column(String, default="pending")
+    status = Column(String, default="pending", index=True)
     customer_address = Column(String, nullable=True)  # Fixed: added nullable=True
     customer_latitude = Column(Float, nullable=True)  # Fixed: added nullable=True
     customer_longitude = Column(Float, nullable=True)  # Fixed: added nullable=True
@@ -63,7 +137,10 @@ class Order(Base):
     branch_info = Column(Text, nullable=True)  # JSON data for external branches
     user_state = Column(String, default="new")  # Track user conversation state
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    # Draft/active order lookups filter on user_id + status
+    __table_args__ = (Index("ix_orders_user_status", "user_id", "status"),)
     
     user = relationship("User", back_populates="orders")
     branch = relationship("Branch", back_populates="orders")
@@ -93,23 +170,52 @@ class Conversation(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     message_type = Column(String)  # 'user' or 'bot'
-    message_text = Column(Text)
+    message_text = Column(String(4096))  # WhatsApp caps text messages at 4096 characters
     timestamp = Column(DateTime, default=datetime.utcnow)
     phone_number = Column(String)
     
+    # Conversation history is fetched per phone number, newest first
+    __table_args__ = (Index("ix_conversations_phone_ts", "phone_number", "timestamp"),)
+    
     user = relationship("User", back_populates="conversations")
     
     def __repr__(self):
-        return f"<Conversation(id={self.id}, user_id={self.user_id}, type='{self.message_type}', text='{self.message_text[:50]}...')>"
-
-# Create tables
-Base.metadata.create_all(bind=engine)
-
-print("✅ SQLite Database tables created successfully!")
-print("📊 Database Schema Summary:")
-print(f"   • User table: 5 columns")
-print(f"   • Branch table: 7 columns")
-print(f"   • MenuItem table: 7 columns")
-print(f"   • Order table: 12 columns (2 new columns added: branch_info, user_state)")
-print(f"   • OrderItem table: 6 columns")
-print(f"   • Conversation table: 6 columns")
\ No newline at end of file
+        return f"<Conversation(id={self.id}, user_id={self.user_id}, type='{self.message_type}')>"
+
+def bulk_log_messages(db, rows: list):
+    """Insert a batch of Conversation rows as one statement and one commit"""
+    if not rows:
+        return
+    db.execute(insert(Conversation), rows)
+    db.commit()
+
+def create_missing_tables(bind=engine) -> list:
+    """Create only the tables that don't exist yet; returns their names"""
+    existing_tables = set(inspect(bind).get_table_names())
+    missing_tables = [table for name, table in Base.metadata.tables.items() if name not in existing_tables]
+    if missing_tables:
+        Base.metadata.create_all(bind=bind, tables=missing_tables)
+    # create_all never touches existing tables, so add any indexes declared since they were created
+    for name, table in Base.metadata.tables.items():
+        if name in existing_tables:
+            for index in table.indexes:
+                index.create(bind=bind, checkfirst=True)
+    return [table.name for table in missing_tables]
+
+SCHEMA_SUMMARY = (
+    "✅ SQLite Database tables created successfully!\n"
+    "📊 Database Schema Summary:\n"
+    "   • User table: 5 columns\n"
+    "   • Branch table: 7 columns\n"
+    "   • MenuItem table: 7 columns\n"
+    "   • Order table: 12 columns (2 new columns added: branch_info, user_state)\n"
+    "   • OrderItem table: 6 columns\n"
+    "   • Conversation table: 6 columns"
+)
+
+def init_db() -> list:
+    """Create any missing tables/indexes - called once from application startup, not on import"""
+    created_tables = create_missing_tables()
+    
+    logger.info(SCHEMA_SUMMARY)
+    return created_tables
\ No newline at end of file
@@ -44,6 +44,15 @@ class Order(OrderBase):
     order_items: List[OrderItem]
     model_config = ConfigDict(from_attributes=True)  # Updated for Pydantic v2
 
+class OrderSummary(BaseModel):
+    """Flat order row for admin listings - no items, branch info or relationships"""
+    id: int
+    user_id: Optional[int] = None
+    status: Optional[str] = None
+    total_amount: Optional[float] = None
+    created_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
 class BranchBase(BaseModel):
     name: str
     address: str
@@ -69,4 +78,22 @@ class UserCreate(UserBase):
 class User(UserBase):
     id: int
     created_at: datetime
-    model_config = ConfigDict(from_attributes=True)  # Updated for Pydantic v2
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)  # Updated for Pydantic v2
+
+class ConfirmAddressRequest(BaseModel):
+    """Body of the voice-order address confirmation endpoint"""
+    address: str = ""
+    confirm: bool = True
+
+class TestMessageRequest(BaseModel):
+    """Body of the send-test WhatsApp endpoint"""
+    phone_number: str = "923001234567"
+    message: str = "Test message from FoodExpress Pakistan"
+
+class MenuListItem(MenuItemBase):
+    """One available item as listed by the menu endpoint"""
+    id: int
+
+class MenuResponse(BaseModel):
+    """Body of the Streamlit menu endpoint"""
+    menu: List[MenuListItem]
\ No newline at end of file
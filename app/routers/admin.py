@@ -1,37 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, insert
 from sqlalchemy.orm import Session
-from app.models.database import SessionLocal, MenuItem, Branch, Order
-from app.models.schemas import MenuItemCreate, BranchCreate
+from typing import List
+from app.models.database import get_db, MenuItem, Branch, Order
+from app.models.schemas import MenuItemCreate, BranchCreate, OrderSummary
+from app.utils.cache import TTLCache, get_menu_version, bump_menu_version
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Page size for the admin list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Encoded menu pages keyed on (menu version, limit, offset) - a menu write bumps the version
+MENU_CACHE_TTL = 30  # seconds
+_menu_page_cache = TTLCache(ttl=MENU_CACHE_TTL, maxsize=32)
 
 @router.get("/menu")
-def get_all_menu_items(db: Session = Depends(get_db)):
-    """Get all menu items"""
-    return db.query(MenuItem).all()
+def get_all_menu_items(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Get menu items, one page at a time"""
+    cache_key = (get_menu_version(), limit, offset)
+    payload = _menu_page_cache.get(cache_key)
+    if payload is None:
+        items = db.scalars(
+            select(MenuItem).order_by(MenuItem.id).limit(limit).offset(offset)
+        ).all()
+        payload = jsonable_encoder(items)
+        _menu_page_cache.set(cache_key, payload)
+    return payload
 
 @router.post("/menu")
 def add_menu_item(menu_item: MenuItemCreate, db: Session = Depends(get_db)):
     """Add new menu item"""
-    db_item = MenuItem(**menu_item.dict())
-    db.add(db_item)
+    # Single-row Core insert with RETURNING - no ORM unit of work or refresh round-trip
+    data = menu_item.model_dump()
+    row = db.execute(
+        insert(MenuItem).values(**data).returning(*MenuItem.__table__.columns)
+    ).mappings().one()
     db.commit()
-    db.refresh(db_item)
-    return db_item
+    bump_menu_version()
+    return dict(row)
 
-@router.get("/orders")
-def get_all_orders(db: Session = Depends(get_db)):
-    """Get all orders"""
-    return db.query(Order).all()
+@router.get("/orders", response_model=List[OrderSummary])
+def get_all_orders(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Get order summaries, newest first, one page at a time"""
+    # Plain column rows - no ORM objects, identity map or relationship loading
+    return db.execute(
+        select(Order.id, Order.user_id, Order.status, Order.total_amount, Order.created_at)
+        .order_by(Order.id.desc()).limit(limit).offset(offset)
+    ).all()
 
 @router.get("/branches")
 def get_all_branches(db: Session = Depends(get_db)):
     """Get all branches"""
-    return db.query(Branch).all()
\ No newline at end of file
+    return db.scalars(select(Branch)).all()
\ No newline at end of file
@@ -1,40 +1,71 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.responses import Response
 import tempfile
 import os
-from app.models.database import SessionLocal
+import asyncio
+import orjson
 from app.services.voice_service import voice_service
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Uploads are copied in chunks, into tmpfs when the host has one
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_TEMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Upload limits - checked before anything is written to disk
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+ALLOWED_AUDIO_TYPES = frozenset({
+    "audio/wav", "audio/x-wav", "audio/wave", "audio/mpeg", "audio/mp3",
+    "audio/ogg", "audio/webm", "audio/mp4", "audio/x-m4a", "audio/aac"
+})
+
+# Transcription runs in worker threads; cap how many run at once so the models aren't oversubscribed
+_transcription_slots = asyncio.BoundedSemaphore(os.cpu_count() or 1)
+
+# Supported languages are fixed per deployment - serialize the /voice-supported body once
+_VOICE_SUPPORT_BODY = orjson.dumps({
+    "voice_supported": True,
+    "languages": voice_service.supported_languages(),
+    "models": ["Whisper (Free)", "Google Speech Recognition"],
+    "status": "active"
+})
 
 @router.post("/transcribe")
-async def transcribe_voice(file: UploadFile = File(...)):
+async def transcribe_voice(request: Request, file: UploadFile = File(...)):
     """Transcribe voice audio to text"""
     try:
-        # Validate file type
-        if not file.content_type.startswith('audio/'):
-            raise HTTPException(status_code=400, detail="Audio file required")
+        # Validate file type (ignore parameters such as "; codecs=opus")
+        content_type = (file.content_type or "").split(";", 1)[0].strip().lower()
+        if content_type not in ALLOWED_AUDIO_TYPES:
+            raise HTTPException(status_code=415, detail="Unsupported audio format")
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        # Reject oversized requests up front when the client declares a length
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Audio file too large")
         
-        # Process voice
-        transcription = voice_service.process_voice_order(temp_file_path)
+        # Save uploaded file temporarily, stopping as soon as the limit is passed
+        with tempfile.NamedTemporaryFile(delete=False, dir=UPLOAD_TEMP_DIR, suffix=".wav") as temp_file:
+            temp_file_path = temp_file.name
+            written = 0
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > MAX_UPLOAD_BYTES:
+                    break
+                temp_file.write(chunk)
+        if written > MAX_UPLOAD_BYTES:
+            os.unlink(temp_file_path)
+            raise HTTPException(status_code=413, detail="Audio file too large")
         
-        # Clean up
-        os.unlink(temp_file_path)
+        # Process voice off the event loop
+        try:
+            async with _transcription_slots:
+                transcription = await asyncio.to_thread(voice_service.process_voice_order, temp_file_path)
+        finally:
+            # Clean up
+            os.unlink(temp_file_path)
         
         if transcription:
             return {
@@ -49,6 +80,8 @@ async def transcribe_voice(file: UploadFile = File(...)):
                 "message": "Voice samajh mein nahi aayi"
             }
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Voice transcription error: {e}")
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
@@ -56,9 +89,4 @@ async def transcribe_voice(file: UploadFile = File(...)):
 @router.get("/voice-supported")
 async def check_voice_support():
     """Check if voice recognition is supported"""
-    return {
-        "voice_supported": True,
-        "languages": voice_service.supported_languages(),
-        "models": ["Whisper (Free)", "Google Speech Recognition"],
-        "status": "active"
-    }
\ No newline at end of file
+    return Response(content=_VOICE_SUPPORT_BODY, media_type="application/json")
\ No newline at end of file
@@ -1,76 +1,153 @@
-from fastapi import APIRouter, Request, HTTPException, Depends, Body
+from fastapi import APIRouter, Request, HTTPException, Depends, Body, Response, Query
 from sqlalchemy.orm import Session
-import json
+from sqlalchemy.ext.asyncio import AsyncSession
+import orjson
 import logging
+import re
 import time
-from app.models.database import SessionLocal
-from app.services.whatsapp_service import WhatsAppService
-from app.services.nlp_service import NLPService
-from app.services.location_service import LocationService
-from app.services.order_service import OrderService
+import os
+import asyncio
+from datetime import datetime
+from typing import Optional
+from app.models.database import SessionLocal, get_db, get_async_db
+from app.services.whatsapp_service import whatsapp_service
+from app.services.nlp_service import nlp_service
+from app.services.location_service import location_service, normalize_address, NEARBY_OPTIONS_TTL
+from app.services.order_service import OrderService, fetch_conversations, fetch_orders_by_phone
 from app.services.voice_service import voice_service
+from app.models.schemas import ConfirmAddressRequest, TestMessageRequest, MenuResponse
+from app.utils.cache import TTLCache, get_menu_version
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Meta webhook subscription token
+VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "foodexpress_pakistan_2024")
+
+# Max messages from one webhook batch handled at once
+MESSAGE_CONCURRENCY = int(os.getenv("MESSAGE_CONCURRENCY", "5"))
+
+# Webhooks are acked immediately and processed in background tasks; cap how many are in flight
+MAX_INFLIGHT_WEBHOOKS = int(os.getenv("MAX_INFLIGHT_WEBHOOKS", "200"))
+_inflight_webhooks = asyncio.Semaphore(MAX_INFLIGHT_WEBHOOKS)
+_background_tasks = set()  # strong references so running tasks aren't garbage-collected
+
+# Slow clients can't hold a webhook open indefinitely while the body trickles in
+WEBHOOK_BODY_TIMEOUT = float(os.getenv("WEBHOOK_BODY_TIMEOUT", "10"))
+
+# How often confirm_address re-checks the user state while waiting for the chat flow to advance
+STATE_POLL_INTERVAL = 0.1
+
+# Text message keyword detection - one precompiled pass per check instead of a scan per keyword.
+# Patterns keep the original substring semantics (no word boundaries).
+# Common words that should NOT trigger location detection
+_COMMON_WORDS = frozenset(["menu", "cancel", "confirm", "order", "help", "hi", "hello", "start", "back", "main", "track"])
+_LOCATION_PREFIXES = ("location:", "address:", "nearby:")
+_LOCATION_WORDS_RE = re.compile("house no|sector|colony|street|road|block|area|plot no")
+_POTENTIAL_LOCATION_RE = re.compile("location:|address:|nearby:|house no|sector|colony|street|road|block|area")
+_ORDER_HINT_RE = re.compile("menu|order|coffee|tea|food")
+_COFFEE_RE = re.compile("coffee|cappuccino|latte|espresso|americano|mocha|tea|chai|juice|croissant|muffin|sandwich|salad|cake|cookie")
+_DIGIT_RE = re.compile(r"\d")
+# Nearby search query: filler phrases to drop, and "<location> within <radius> km"
+_NEAR_ME_RE = re.compile("near me|around me")
+_EXPLICIT_ADDRESS_RE = re.compile("location:|address:|nearby:")
+_NEARBY_RADIUS_RE = re.compile(r"(?P<location>.*?)within\s*(?P<radius>\d+(?:\.\d+)?)?", re.S)
+
+# Geocodes in flight keyed on normalized address, so concurrent lookups of one address share a call
+_inflight_geocodes = {}
+
+# Static bot replies shared by several handlers
+_CONFIRM_PROMPT = "✅ Type 'confirm' to place order\n❌ Type 'cancel' to cancel"
+_NEARBY_HINT = "📍 To find nearby restaurants, please share your location or type your address.\nExample: 'coffee near me' or 'location: Gulshan, Karachi'"
+_TRACK_HINT = "📦 To track your order, please provide your order ID.\nExample: 'track order 1'"
+
+# History endpoints page with a keyset cursor: pass the returned next_before to get older rows
+DEFAULT_HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 500
+
+# Serialized /menu response keyed on the menu version, so repeat polls skip JSON encoding
+_menu_response_cache = TTLCache(ttl=300, maxsize=1)
 
 @router.get("/webhook")
 async def verify_webhook(request: Request):
     """Verify webhook for WhatsApp API"""
-    query_params = dict(request.query_params)
+    query_params = request.query_params
     
     mode = query_params.get("hub.mode")
     token = query_params.get("hub.verify_token")
     challenge = query_params.get("hub.challenge")
     
-    verify_token = "foodexpress_pakistan_2024"
-    
     if mode and token:
-        if mode == "subscribe" and token == verify_token:
+        if mode == "subscribe" and token == VERIFY_TOKEN:
             logger.info("✅ WhatsApp webhook verified successfully!")
             return int(challenge)
         else:
             raise HTTPException(status_code=403, detail="Verification failed")
     
-    return {"status": "webhook verification endpoint", "verify_token": verify_token}
+    return {"status": "webhook verification endpoint", "verify_token": VERIFY_TOKEN}
 
 @router.post("/webhook")
 async def webhook_handler(request: Request, db: Session = Depends(get_db)):
     """Handle incoming WhatsApp messages - Now with GREEN-API support"""
     try:
-        body = await request.body()
-        body_str = body.decode('utf-8')
+        try:
+            body = await asyncio.wait_for(request.body(), timeout=WEBHOOK_BODY_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ Webhook body read timed out")
+            return {"status": "error", "message": "Request body timeout"}
         
-        if not body_str:
+        if not body:
             return await handle_demo_message(db)
         
+        # GREEN-API also posts status callbacks (acks, state changes) that we never act on -
+        # a byte scan spots them without parsing the payload or queueing a task
+        if b'"typeWebhook"' in body and b'incomingMessageReceived' not in body:
+            return {"status": "ignored"}
+        
         try:
-            webhook_data = json.loads(body_str)
-            logger.info(f"📩 Webhook received: {webhook_data}")
+            # orjson parses the raw bytes directly - no separate UTF-8 decode pass
+            webhook_data = orjson.loads(body)
+            logger.info("📩 Webhook received: %s", webhook_data)
+            
+            # Non-message GREEN-API events that slipped past the byte scan
+            webhook_type = webhook_data.get('typeWebhook') if isinstance(webhook_data, dict) else None
+            if webhook_type and webhook_type != 'incomingMessageReceived':
+                return {"status": "ignored", "webhook_type": webhook_type}
             
-            # Handle GREEN-API webhook format
-            if 'typeWebhook' in webhook_data:
-                return await handle_greenapi_webhook(webhook_data, db)
-            # Handle Meta webhook format
-            elif 'entry' in webhook_data:
-                return await handle_meta_webhook(webhook_data, db)
+            # GREEN-API and Meta formats: ack now so the provider doesn't retry, process in the background
+            if 'typeWebhook' in webhook_data or 'entry' in webhook_data:
+                # Waits here only when MAX_INFLIGHT_WEBHOOKS are already running (backpressure)
+                await _inflight_webhooks.acquire()
+                task = asyncio.create_task(_dispatch_webhook(webhook_data))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+                return {"status": "queued"}
             else:
                 return await handle_demo_message(db)
                 
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             return await handle_demo_message(db)
             
     except Exception as e:
-        logger.error(f"❌ Webhook error: {e}")
+        logger.error("❌ Webhook error: %s", e)
         return {"status": "error", "message": str(e)}
 
+async def _dispatch_webhook(webhook_data: dict):
+    """Background processing of an acked webhook with its own session"""
+    db = SessionLocal()
+    try:
+        # Handle GREEN-API webhook format
+        if 'typeWebhook' in webhook_data:
+            await handle_greenapi_webhook(webhook_data, db)
+        # Handle Meta webhook format
+        else:
+            await handle_meta_webhook(webhook_data, db)
+    except Exception as e:
+        logger.error("❌ Background webhook error: %s", e)
+    finally:
+        db.close()
+        _inflight_webhooks.release()
+
 async def handle_greenapi_webhook(webhook_data: dict, db: Session):
     """Handle GREEN-API webhook format"""
     webhook_type = webhook_data.get('typeWebhook', '')
@@ -82,58 +159,20 @@ async def handle_greenapi_webhook(webhook_data: dict, db: Session):
         phone_number = sender_data.get('chatId', '').replace('@c.us', '')
         message_type = message_data.get('typeMessage', '')
         
-        logger.info(f"📱 GREEN-API: Message from {phone_number}, type: {message_type}")
+        logger.info("📱 GREEN-API: Message from %s, type: %s", phone_number, message_type)
         
         if message_type == 'textMessage':
             message_text = message_data.get('textMessageData', {}).get('textMessage', '')
-            return await process_whatsapp_message({
-                "entry": [{
-                    "changes": [{
-                        "value": {
-                            "messages": [{
-                                "from": phone_number,
-                                "type": "text",
-                                "text": {"body": message_text},
-                                "timestamp": webhook_data.get('timestamp', '')
-                            }]
-                        }
-                    }]
-                }]
-            }, db)
+            return await process_normalized_message(phone_number, "text", webhook_data.get('timestamp', ''), db, text=message_text)
         
         elif message_type == 'extendedTextMessage':
             message_text = message_data.get('extendedTextMessageData', {}).get('text', '')
-            return await process_whatsapp_message({
-                "entry": [{
-                    "changes": [{
-                        "value": {
-                            "messages": [{
-                                "from": phone_number,
-                                "type": "text", 
-                                "text": {"body": message_text},
-                                "timestamp": webhook_data.get('timestamp', '')
-                            }]
-                        }
-                    }]
-                }]
-            }, db)
+            return await process_normalized_message(phone_number, "text", webhook_data.get('timestamp', ''), db, text=message_text)
         
         elif message_type == 'audioMessage':
             # Handle voice messages in GREEN-API
-            logger.info(f"🎤 GREEN-API Voice message from {phone_number}")
-            return await process_whatsapp_message({
-                "entry": [{
-                    "changes": [{
-                        "value": {
-                            "messages": [{
-                                "from": phone_number,
-                                "type": "audio",
-                                "timestamp": webhook_data.get('timestamp', '')
-                            }]
-                        }
-                    }]
-                }]
-            }, db)
+            logger.info("🎤 GREEN-API Voice message from %s", phone_number)
+            return await process_normalized_message(phone_number, "audio", webhook_data.get('timestamp', ''), db)
     
     return {"status": "processed", "webhook_type": webhook_type}
 
@@ -145,22 +184,7 @@ async def handle_demo_message(db: Session):
     """Handle demo message when no webhook data"""
     logger.info("🎯 Running in DEMO MODE - No actual webhook data")
     
-    demo_message = {
-        "entry": [{
-            "changes": [{
-                "value": {
-                    "messages": [{
-                        "from": "923001234567",
-                        "type": "text",
-                        "text": {"body": "hello"},
-                        "timestamp": "1700000000"
-                    }]
-                }
-            }]
-        }]
-    }
-    
-    return await process_whatsapp_message(demo_message, db)
+    return await process_normalized_message("923001234567", "text", "1700000000", db, text="hello")
 
 @router.post("/demo/chat")
 async def demo_chat_endpoint(request: Request, db: Session = Depends(get_db)):
@@ -172,37 +196,22 @@ async def demo_chat_endpoint(request: Request, db: Session = Depends(get_db)):
             return await process_demo_message("hello", "923001234567", db)
         
         try:
-            body = json.loads(body_bytes.decode('utf-8'))
+            body = orjson.loads(body_bytes)
             message = body.get("message", "hello")
             phone_number = body.get("phone_number", "923001234567")
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             message = "hello"
             phone_number = "923001234567"
         
         return await process_demo_message(message, phone_number, db)
         
     except Exception as e:
-        logger.error(f"❌ Error in demo chat: {e}")
+        logger.error("❌ Error in demo chat: %s", e)
         return {"status": "error", "message": str(e)}
 
 async def process_demo_message(message: str, phone_number: str, db: Session):
     """Process demo message"""
-    demo_message = {
-        "entry": [{
-            "changes": [{
-                "value": {
-                    "messages": [{
-                        "from": phone_number,
-                        "type": "text", 
-                        "text": {"body": message},
-                        "timestamp": "1700000000"
-                    }]
-                }
-            }]
-        }]
-    }
-    
-    result = await process_whatsapp_message(demo_message, db)
+    result = await process_normalized_message(phone_number, "text", "1700000000", db, text=message)
     return {
         "status": "demo_processed", 
         "message": message, 
@@ -211,26 +220,66 @@ async def process_demo_message(message: str, phone_number: str, db: Session):
     }
 
 async def process_whatsapp_message(message_data, db):
-    """Process WhatsApp message - Updated for voice support"""
-    whatsapp_service = WhatsAppService()
-    nlp_service = NLPService()
-    location_service = LocationService()
-    order_service = OrderService(db)
-    
+    """Process WhatsApp message(s) - every message in the batch, not just the first"""
     try:
         entry = message_data.get("entry", [{}])[0]
         changes = entry.get("changes", [{}])[0]
         value = changes.get("value", {})
         messages = value.get("messages", [])
-        
-        if not messages:
-            return {"status": "no_messages"}
-        
-        message_data = messages[0]
+    except Exception as e:
+        logger.error("❌ Error reading webhook messages: %s", e)
+        return {"status": "error", "message": str(e)}
+    
+    if not messages:
+        return {"status": "no_messages"}
+    
+    if len(messages) == 1:
+        await _handle_one(messages[0], db)
+    else:
+        # One sender's messages stay in order (they share conversation state); different senders run concurrently
+        by_sender = {}
+        for message in messages:
+            by_sender.setdefault(message.get("from"), []).append(message)
+        slots = asyncio.Semaphore(MESSAGE_CONCURRENCY)  # bounds this batch's fan-out only
+        results = await asyncio.gather(
+            *(_handle_sender_messages(batch, slots) for batch in by_sender.values()),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("❌ Error processing message batch: %s", result)
+    
+    return {"status": "processed", "user": messages[0].get("from"), "messages": len(messages)}
+
+async def process_normalized_message(phone_number: str, message_type: str, timestamp, db, text: str = None):
+    """Handle one already-parsed message directly, without wrapping it in a Meta-style payload"""
+    message = {"from": phone_number, "type": message_type, "timestamp": timestamp}
+    if text is not None:
+        message["text"] = {"body": text}
+    await _handle_one(message, db)
+    return {"status": "processed", "user": phone_number, "messages": 1}
+
+async def _handle_sender_messages(messages, slots: asyncio.Semaphore):
+    """Handle one sender's messages in order with their own session"""
+    # Sessions can't be shared between concurrently running tasks
+    db = SessionLocal()
+    try:
+        for message in messages:
+            async with slots:
+                await _handle_one(message, db)
+    finally:
+        db.close()
+
+async def _handle_one(message_data, db):
+    """Handle a single WhatsApp message - Updated for voice support"""
+    # Queue this turn's user/bot messages and write them together at the end
+    order_service = OrderService(db, batch_conversations=True)
+    
+    try:
         user_number = message_data.get("from")
         message_type = message_data.get("type")
         
-        logger.info(f"📱 Processing {message_type} from {user_number}")
+        logger.info("📱 Processing %s from %s", message_type, user_number)
         
         # Save user message to database
         if message_type == "text":
@@ -259,18 +308,38 @@ async def process_whatsapp_message(message_data, db):
             )
     
     except Exception as e:
-        logger.error(f"❌ Error processing message: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    return {"status": "processed", "user": user_number}
+        logger.exception("❌ Error processing message: %s", e)
+    finally:
+        order_service.flush_conversations()
+
+async def _geocode(address: str):
+    """Geocode in a worker thread, joining an identical lookup that's already running"""
+    key = normalize_address(address)  # same identity as location_service's geocode caches
+    inflight = _inflight_geocodes.get(key)
+    if inflight is None:
+        inflight = asyncio.ensure_future(asyncio.to_thread(location_service.geocode_address, address))
+        _inflight_geocodes[key] = inflight
+        inflight.add_done_callback(lambda _: _inflight_geocodes.pop(key, None))
+    # Shielded so one caller being cancelled doesn't cancel the lookup for the others
+    return await asyncio.shield(inflight)
+
+async def _send_alongside(user_number: str, message: str, *db_calls):
+    """Send a reply while independent sync DB updates run in a worker thread"""
+    # The session is only touched by the worker thread while the send is in flight
+    def run_db_calls():
+        for db_call in db_calls:
+            db_call()
+    await asyncio.gather(
+        whatsapp_service.send_text_message_async(user_number, message),
+        asyncio.to_thread(run_db_calls)
+    )
 
 async def handle_voice_message(message_data, user_number, whatsapp_service, nlp_service, location_service, order_service):
     """Handle voice messages from users"""
     try:
         # In real WhatsApp, voice messages would come as audio files
         # For demo, we'll simulate voice processing
-        logger.info(f"🎤 Processing voice message from {user_number}")
+        logger.info("🎤 Processing voice message from %s", user_number)
         
         # For demo purposes, we'll use a simulated voice message
         # In production, you would download the audio file from WhatsApp
@@ -295,37 +364,33 @@ async def handle_voice_message(message_data, user_number, whatsapp_service, nlp_
             )
         else:
             error_msg = "❌ Could not understand voice. Please speak clearly or type your order."
-            whatsapp_service.send_text_message(user_number, error_msg)
+            await whatsapp_service.send_text_message_async(user_number, error_msg)
             order_service.save_conversation(user_number, "bot", error_msg)
             
     except Exception as e:
-        logger.error(f"❌ Error processing voice message: {e}")
+        logger.error("❌ Error processing voice message: %s", e)
         error_msg = "❌ Error processing voice. Please try again."
-        whatsapp_service.send_text_message(user_number, error_msg)
+        await whatsapp_service.send_text_message_async(user_number, error_msg)
         order_service.save_conversation(user_number, "bot", error_msg)
 
 async def handle_text_message(message_data, user_number, whatsapp_service, nlp_service, location_service, order_service):
     """Handle text messages from users - UPDATED WITH NEARBY RESTAURANTS & COFFEE SHOP"""
     message_text = message_data.get("text", {}).get("body", "").strip()
+    message_lower = message_text.lower()
     
-    logger.info(f"💬 Processing message: '{message_text}' from {user_number}")
+    logger.info("💬 Processing message: '%s' from %s", message_text, user_number)
     
     user_state = order_service.get_user_state(user_number)
-    logger.info(f"🔀 User state: {user_state}")
-    
-    # Common words that should NOT trigger location detection
-    common_words = ["menu", "cancel", "confirm", "order", "help", "hi", "hello", "start", "back", "main", "track"]
+    logger.info("🔀 User state: %s", user_state)
     
     # Check if this is a location/address message
     is_explicit_location = (
-        message_text.lower().startswith("location:") or 
-        message_text.lower().startswith("address:") or
-        message_text.lower().startswith("nearby:") or
-        any(word in message_text.lower() for word in ["house no", "sector", "colony", "street", "road", "block", "area", "plot no"])
+        message_lower.startswith(_LOCATION_PREFIXES) or
+        _LOCATION_WORDS_RE.search(message_lower) is not None
     )
     
     # Determine if this is a location message
-    if message_text.lower() in common_words:
+    if message_lower in _COMMON_WORDS:
         is_location_message = False
     elif user_state == "awaiting_location":
         # When awaiting location, treat most messages as location attempts
@@ -334,7 +399,7 @@ async def handle_text_message(message_data, user_number, whatsapp_service, nlp_s
     else:
         is_location_message = is_explicit_location
     
-    logger.info(f"📍 Location detection: is_location_message={is_location_message}, explicit={is_explicit_location}")
+    logger.info("📍 Location detection: is_location_message=%s, explicit=%s", is_location_message, is_explicit_location)
     
     # Handle restaurant selection (e.g., "1", "2", "3")
     if message_text.isdigit() and user_state == "awaiting_restaurant_choice":
@@ -343,22 +408,27 @@ async def handle_text_message(message_data, user_number, whatsapp_service, nlp_s
             user_number, restaurant_number, whatsapp_service, location_service, order_service
         )
     
+    # "pizza near me" means the user's own location - reuse the one they already shared instead of geocoding
+    if (_NEAR_ME_RE.search(message_lower) and not _EXPLICIT_ADDRESS_RE.search(message_lower)
+            and order_service.get_temporary_location(user_number)):
+        return await handle_nearby_search(message_text, user_number, whatsapp_service, location_service, order_service)
+    
     # Handle location/address input (from Streamlit or WhatsApp)
     if is_location_message:
-        logger.info(f"📍 Detected location message: {message_text}")
+        logger.info("📍 Detected location message: %s", message_text)
         
         # Check if it's a nearby search
-        if "nearby:" in message_text.lower():
+        if "nearby:" in message_lower:
             return await handle_nearby_search(message_text, user_number, whatsapp_service, location_service, order_service)
         
         # Extract address from message
-        if "location:" in message_text.lower():
-            address = message_text.lower().split("location:")[1].strip()
-        elif "address:" in message_text.lower():
-            address = message_text.lower().split("address:")[1].strip()
-        elif "near me" in message_text.lower() or "around me" in message_text.lower():
+        if "location:" in message_lower:
+            address = message_lower.split("location:")[1].strip()
+        elif "address:" in message_lower:
+            address = message_lower.split("address:")[1].strip()
+        elif "near me" in message_lower or "around me" in message_lower:
             # Extract location from phrases like "coffee near me"
-            address = message_text.lower().replace("near me", "").replace("around me", "").replace("coffee", "").replace("restaurant", "").strip()
+            address = message_lower.replace("near me", "").replace("around me", "").replace("coffee", "").replace("restaurant", "").strip()
             if not address:
                 address = "current location"
         else:
@@ -371,11 +441,11 @@ async def handle_text_message(message_data, user_number, whatsapp_service, nlp_s
             address = parts[0].strip()
             instructions = parts[1].strip() if len(parts) > 1 else None
         
-        logger.info(f"📍 Processing address: {address}")
+        logger.info("📍 Processing address: %s", address)
         
         if address and address.lower() != "current location":
-            # Convert address to coordinates using LocationService
-            lat, lon, formatted_address = location_service.geocode_address(address)
+            # Convert address to coordinates using LocationService (blocking HTTP, so in a worker thread)
+            lat, lon, formatted_address = await _geocode(address)
             
             if lat and lon:
                 # Get nearby restaurants
@@ -385,14 +455,13 @@ async def handle_text_message(message_data, user_number, whatsapp_service, nlp_s
                     # Format restaurant options
                     restaurant_text = location_service.format_nearby_restaurants_text(lat, lon)
                     
-                    whatsapp_service.send_text_message(user_number, restaurant_text)
+                    # Update state to wait for restaurant choice and save the location while the list goes out
+                    await _send_alongside(
+                        user_number, restaurant_text,
+                        lambda: order_service.update_user_state(user_number, "awaiting_restaurant_choice"),
+                        lambda: order_service.save_temporary_location(user_number, lat, lon, formatted_address, nearby_options)
+                    )
                     order_service.save_conversation(user_number, "bot", restaurant_text)
-                    
-                    # Update state to wait for restaurant choice
-                    order_service.update_user_state(user_number, "awaiting_restaurant_choice")
-                    
-                    # Save location temporarily
-                    order_service.save_temporary_location(user_number, lat, lon, formatted_address)
                     return
                 else:
                     # If no restaurants, find nearest branch
@@ -405,198 +474,213 @@ async def handle_text_message(message_data, user_number, whatsapp_service, nlp_s
                         )
                     else:
                         error_msg = "❌ No restaurants found nearby. Please try a different location."
-                        whatsapp_service.send_text_message(user_number, error_msg)
+                        await whatsapp_service.send_text_message_async(user_number, error_msg)
                         order_service.save_conversation(user_number, "bot", error_msg)
             else:
                 error_msg = "❌ Could not find this location. Please provide a more specific address."
-                whatsapp_service.send_text_message(user_number, error_msg)
+                await whatsapp_service.send_text_message_async(user_number, error_msg)
                 order_service.save_conversation(user_number, "bot", error_msg)
         else:
             # Handle "current location" or empty address
             response_msg = "📍 Please share your location using WhatsApp's location feature or type your address."
-            whatsapp_service.send_text_message(user_number, response_msg)
+            await whatsapp_service.send_text_message_async(user_number, response_msg)
             order_service.save_conversation(user_number, "bot", response_msg)
     
     elif user_state == "awaiting_confirmation":
-        if "confirm" in message_text.lower():
+        if "confirm" in message_lower:
             order = order_service.confirm_order(user_number)
             if order:
                 response_message = f"✅ Order #{order.id} confirmed! Total: Rs. {order.total_amount:,.0f}\nYour order will be ready in 20-25 minutes."
-                whatsapp_service.send_text_message(user_number, response_message)
+                await whatsapp_service.send_text_message_async(user_number, response_message)
                 order_service.save_conversation(user_number, "bot", response_message)
-                logger.info(f"✅ Order #{order.id} confirmed for {user_number}")
+                logger.info("✅ Order #%s confirmed for %s", order.id, user_number)
             else:
                 response_message = "❌ No pending order found. Start a new order."
-                whatsapp_service.send_text_message(user_number, response_message)
+                await whatsapp_service.send_text_message_async(user_number, response_message)
                 order_service.save_conversation(user_number, "bot", response_message)
         
-        elif "cancel" in message_text.lower():
-            order_service.cancel_pending_order(user_number)
+        elif "cancel" in message_lower:
             response_message = "❌ Order cancelled. You can start a new order."
-            whatsapp_service.send_text_message(user_number, response_message)
+            await _send_alongside(user_number, response_message, lambda: order_service.cancel_pending_order(user_number))
             order_service.save_conversation(user_number, "bot", response_message)
         else:
-            response_message = "✅ Type 'confirm' to place order\n❌ Type 'cancel' to cancel"
-            whatsapp_service.send_text_message(user_number, response_message)
+            response_message = _CONFIRM_PROMPT
+            await whatsapp_service.send_text_message_async(user_number, response_message)
             order_service.save_conversation(user_number, "bot", response_message)
     
     elif user_state == "awaiting_location":
         # Check if it's a common word that should be handled differently
-        if message_text.lower() in common_words:
+        if message_lower in _COMMON_WORDS:
             # Handle common words in awaiting_location state
-            if message_text.lower() == "cancel":
-                order_service.cancel_pending_order(user_number)
+            if message_lower == "cancel":
                 response_message = "❌ Order cancelled. You can start a new order."
-                whatsapp_service.send_text_message(user_number, response_message)
+                await _send_alongside(user_number, response_message, lambda: order_service.cancel_pending_order(user_number))
                 order_service.save_conversation(user_number, "bot", response_message)
-            elif message_text.lower() == "menu":
+            elif message_lower == "menu":
                 menu_items = order_service.get_menu_items()
                 menu_message = whatsapp_service.create_menu_list(menu_items)
-                whatsapp_service.send_text_message(user_number, menu_message)
+                await whatsapp_service.send_text_message_async(user_number, menu_message)
                 order_service.save_conversation(user_number, "bot", menu_message)
             else:
                 # For other common words, send location request
                 response_message = whatsapp_service.create_location_request()
-                whatsapp_service.send_text_message(user_number, response_message)
+                await whatsapp_service.send_text_message_async(user_number, response_message)
                 order_service.save_conversation(user_number, "bot", response_message)
         else:
             # Send location request message
             response_message = whatsapp_service.create_location_request()
-            whatsapp_service.send_text_message(user_number, response_message)
+            await whatsapp_service.send_text_message_async(user_number, response_message)
             order_service.save_conversation(user_number, "bot", response_message)
     
     else:
         # Check if this is NOT a location message before processing as order
-        location_keywords = ["location:", "address:", "nearby:", "house no", "sector", "colony", "street", "road", "block", "area"]
-        is_potential_location = any(keyword in message_text.lower() for keyword in location_keywords)
+        is_potential_location = _POTENTIAL_LOCATION_RE.search(message_lower) is not None
         
         if not is_potential_location:
             # IMPROVED CANCEL HANDLING - Check for cancel command first
-            if "cancel" in message_text.lower():
+            if "cancel" in message_lower:
                 # Check if there's a pending order to cancel
                 pending_order = order_service.get_pending_order(user_number)
                 if pending_order:
-                    order_service.cancel_pending_order(user_number)
                     response_message = "❌ Order cancelled. You can start a new order."
-                    whatsapp_service.send_text_message(user_number, response_message)
+                    await _send_alongside(user_number, response_message, lambda: order_service.cancel_pending_order(user_number))
                     order_service.save_conversation(user_number, "bot", response_message)
                 else:
                     # No pending order, show menu
                     menu_items = order_service.get_menu_items()
                     menu_message = whatsapp_service.create_menu_list(menu_items)
-                    whatsapp_service.send_text_message(user_number, menu_message)
+                    await whatsapp_service.send_text_message_async(user_number, menu_message)
                     order_service.save_conversation(user_number, "bot", menu_message)
                 return  # Exit early after handling cancel
             
-            intent = nlp_service.detect_intent(message_text.lower())
-            logger.info(f"🎯 Detected intent: {intent}")
-            
-            # Handle different intents
-            if intent == "nearby_restaurants":
-                response_msg = "📍 To find nearby restaurants, please share your location or type your address.\nExample: 'coffee near me' or 'location: Gulshan, Karachi'"
-                whatsapp_service.send_text_message(user_number, response_msg)
-                order_service.save_conversation(user_number, "bot", response_msg)
+            intent = nlp_service.detect_intent(message_lower)
+            logger.info("🎯 Detected intent: %s", intent)
             
-            elif intent == "get_menu":
-                menu_items = order_service.get_menu_items()
-                menu_message = whatsapp_service.create_menu_list(menu_items)
-                whatsapp_service.send_text_message(user_number, menu_message)
-                order_service.save_conversation(user_number, "bot", menu_message)
+            # Order-ish keywords turn anything but nearby/menu requests into an order attempt
+            if intent not in ("nearby_restaurants", "get_menu") and _ORDER_HINT_RE.search(message_lower):
+                intent = "place_order"
             
-            elif intent in ["place_order", "greeting"] or any(word in message_text.lower() for word in ["menu", "order", "coffee", "tea", "food"]):
-                menu_items = order_service.get_menu_items()
-                
-                # Check if this looks like an actual order
-                has_numbers = any(char.isdigit() for char in message_text)
-                coffee_keywords = ['coffee', 'cappuccino', 'latte', 'espresso', 'americano', 'mocha', 'tea', 'chai', 'juice', 'croissant', 'muffin', 'sandwich', 'salad', 'cake', 'cookie']
-                has_coffee_keywords = any(keyword in message_text.lower() for keyword in coffee_keywords)
-                
-                # Process as order if it has numbers OR coffee keywords
-                if has_numbers or has_coffee_keywords:
-                    extracted_items = nlp_service.extract_order_items(message_text)
-                    
-                    if extracted_items:
-                        validated_items, invalid_items = nlp_service.validate_menu_items(extracted_items, menu_items)
-                        
-                        if validated_items:
-                            order = order_service.create_temporary_order(user_number, validated_items)
-                            
-                            if order:
-                                # Set user state to awaiting location
-                                order_service.update_user_state(user_number, "awaiting_location")
-                                
-                                # Send location request immediately
-                                location_message = whatsapp_service.create_location_request()
-                                whatsapp_service.send_text_message(user_number, location_message)
-                                order_service.save_conversation(user_number, "bot", location_message)
-                                
-                                if invalid_items:
-                                    invalid_message = f"ℹ️ These items not found: {', '.join(invalid_items)}"
-                                    whatsapp_service.send_text_message(user_number, invalid_message)
-                                    order_service.save_conversation(user_number, "bot", invalid_message)
-                            else:
-                                error_message = "❌ Error creating order. Please try again."
-                                whatsapp_service.send_text_message(user_number, error_message)
-                                order_service.save_conversation(user_number, "bot", error_message)
-                        else:
-                            # If no items validated, still create a basic order and ask for location
-                            if has_numbers:
-                                basic_items = [{"item": "custom", "quantity": 1, "price": 200}]
-                                order = order_service.create_temporary_order(user_number, basic_items)
-                                if order:
-                                    order_service.update_user_state(user_number, "awaiting_location")
-                                    location_message = whatsapp_service.create_location_request()
-                                    whatsapp_service.send_text_message(user_number, location_message)
-                                    order_service.save_conversation(user_number, "bot", location_message)
-                                
-                                invalid_message = "ℹ️ Your order is being processed. Please share your location."
-                                whatsapp_service.send_text_message(user_number, invalid_message)
-                                order_service.save_conversation(user_number, "bot", invalid_message)
-                            else:
-                                # Send menu for browsing
-                                menu_message = whatsapp_service.create_menu_list(menu_items)
-                                whatsapp_service.send_text_message(user_number, menu_message)
-                                order_service.save_conversation(user_number, "bot", menu_message)
-                    else:
-                        # If extraction failed but has numbers, still try to create order
-                        if has_numbers:
-                            basic_items = [{"item": "custom", "quantity": 1, "price": 200}]
-                            order = order_service.create_temporary_order(user_number, basic_items)
-                            if order:
-                                order_service.update_user_state(user_number, "awaiting_location")
-                                location_message = whatsapp_service.create_location_request()
-                                whatsapp_service.send_text_message(user_number, location_message)
-                                order_service.save_conversation(user_number, "bot", location_message)
-                        else:
-                            # Send menu for browsing
-                            menu_message = whatsapp_service.create_menu_list(menu_items)
-                            whatsapp_service.send_text_message(user_number, menu_message)
-                            order_service.save_conversation(user_number, "bot", menu_message)
+            handler = _INTENT_HANDLERS.get(intent, _send_welcome)
+            await handler(user_number, message_text, message_lower, whatsapp_service, nlp_service, order_service)
+        else:
+            # This looks like a location message but user state is not set, ask for order first
+            response_message = "❌ Please place an order first, then share your location."
+            await whatsapp_service.send_text_message_async(user_number, response_message)
+            order_service.save_conversation(user_number, "bot", response_message)
+
+# Intent handlers for handle_text_message - all share one signature so they can sit in a dispatch table
+async def _send_nearby_hint(user_number, message_text, message_lower, whatsapp_service, nlp_service, order_service):
+    response_msg = _NEARBY_HINT
+    await whatsapp_service.send_text_message_async(user_number, response_msg)
+    order_service.save_conversation(user_number, "bot", response_msg)
+
+async def _send_menu(user_number, message_text, message_lower, whatsapp_service, nlp_service, order_service):
+    menu_items = order_service.get_menu_items()
+    menu_message = whatsapp_service.create_menu_list(menu_items)
+    await whatsapp_service.send_text_message_async(user_number, menu_message)
+    order_service.save_conversation(user_number, "bot", menu_message)
+
+async def _start_order(user_number, message_text, message_lower, whatsapp_service, nlp_service, order_service):
+    menu_items = order_service.get_menu_items()
+
+    # Check if this looks like an actual order
+    has_numbers = _DIGIT_RE.search(message_text) is not None
+    has_coffee_keywords = _COFFEE_RE.search(message_lower) is not None
+
+    # Process as order if it has numbers OR coffee keywords
+    if has_numbers or has_coffee_keywords:
+        extracted_items = nlp_service.extract_order_items(message_text)
+
+        if extracted_items:
+            validated_items, invalid_items = nlp_service.validate_menu_items(extracted_items, menu_items)
+
+            if validated_items:
+                order = order_service.create_temporary_order(user_number, validated_items)
+
+                if order:
+                    # Set user state to awaiting location
+                    order_service.update_user_state(user_number, "awaiting_location")
+
+                    # Send location request immediately - unmatched items go in the same message
+                    location_message = whatsapp_service.create_location_request()
+                    if invalid_items:
+                        location_message += f"\n\nℹ️ These items not found: {', '.join(invalid_items)}"
+                    await whatsapp_service.send_text_message_async(user_number, location_message)
+                    order_service.save_conversation(user_number, "bot", location_message)
+                else:
+                    error_message = "❌ Error creating order. Please try again."
+                    await whatsapp_service.send_text_message_async(user_number, error_message)
+                    order_service.save_conversation(user_number, "bot", error_message)
+            else:
+                # If no items validated, still create a basic order and ask for location
+                if has_numbers:
+                    basic_items = [{"item": "custom", "quantity": 1, "price": 200}]
+                    order = order_service.create_temporary_order(user_number, basic_items)
+                    processing_message = "ℹ️ Your order is being processed. Please share your location."
+                    if order:
+                        order_service.update_user_state(user_number, "awaiting_location")
+                        # One outbound message instead of location request + processing note
+                        processing_message = f"{whatsapp_service.create_location_request()}\n\n{processing_message}"
+
+                    await whatsapp_service.send_text_message_async(user_number, processing_message)
+                    order_service.save_conversation(user_number, "bot", processing_message)
                 else:
                     # Send menu for browsing
                     menu_message = whatsapp_service.create_menu_list(menu_items)
-                    whatsapp_service.send_text_message(user_number, menu_message)
+                    await whatsapp_service.send_text_message_async(user_number, menu_message)
                     order_service.save_conversation(user_number, "bot", menu_message)
-            
-            elif intent == "track_order":
-                track_message = "📦 To track your order, please provide your order ID.\nExample: 'track order 1'"
-                whatsapp_service.send_text_message(user_number, track_message)
-                order_service.save_conversation(user_number, "bot", track_message)
-            
-            elif intent == "branch_info":
-                branches_info = order_service.get_branches_info()
-                whatsapp_service.send_text_message(user_number, branches_info)
-                order_service.save_conversation(user_number, "bot", branches_info)
-            
-            else:
-                welcome_text, buttons = whatsapp_service.create_welcome_message()
-                whatsapp_service.send_buttons_message(user_number, welcome_text, buttons)
-                order_service.save_conversation(user_number, "bot", welcome_text)
         else:
-            # This looks like a location message but user state is not set, ask for order first
-            response_message = "❌ Please place an order first, then share your location."
-            whatsapp_service.send_text_message(user_number, response_message)
-            order_service.save_conversation(user_number, "bot", response_message)
+            # If extraction failed but has numbers, still try to create order
+            if has_numbers:
+                basic_items = [{"item": "custom", "quantity": 1, "price": 200}]
+                order = order_service.create_temporary_order(user_number, basic_items)
+                if order:
+                    order_service.update_user_state(user_number, "awaiting_location")
+                    location_message = whatsapp_service.create_location_request()
+                    await whatsapp_service.send_text_message_async(user_number, location_message)
+                    order_service.save_conversation(user_number, "bot", location_message)
+            else:
+                # Send menu for browsing
+                menu_message = whatsapp_service.create_menu_list(menu_items)
+                await whatsapp_service.send_text_message_async(user_number, menu_message)
+                order_service.save_conversation(user_number, "bot", menu_message)
+    else:
+        # Send menu for browsing
+        menu_message = whatsapp_service.create_menu_list(menu_items)
+        await whatsapp_service.send_text_message_async(user_number, menu_message)
+        order_service.save_conversation(user_number, "bot", menu_message)
+
+async def _send_track_hint(user_number, message_text, message_lower, whatsapp_service, nlp_service, order_service):
+    track_message = _TRACK_HINT
+    await whatsapp_service.send_text_message_async(user_number, track_message)
+    order_service.save_conversation(user_number, "bot", track_message)
+
+async def _send_branches(user_number, message_text, message_lower, whatsapp_service, nlp_service, order_service):
+    branches_info = order_service.get_branches_info()
+    await whatsapp_service.send_text_message_async(user_number, branches_info)
+    order_service.save_conversation(user_number, "bot", branches_info)
+
+async def _send_welcome(user_number, message_text, message_lower, whatsapp_service, nlp_service, order_service):
+    welcome_text, buttons = whatsapp_service.create_welcome_message()
+    await whatsapp_service.send_buttons_message_async(user_number, welcome_text, buttons)
+    order_service.save_conversation(user_number, "bot", welcome_text)
+
+_INTENT_HANDLERS = {
+    "nearby_restaurants": _send_nearby_hint,
+    "get_menu": _send_menu,
+    "place_order": _start_order,
+    "greeting": _start_order,
+    "track_order": _send_track_hint,
+    "branch_info": _send_branches,
+}
+
+# Welcome-button ids map onto the same handlers as the matching text intents
+_BUTTON_HANDLERS = {
+    "order_food": _send_menu,
+    "track_order": _send_track_hint,
+    "branch_info": _send_branches,
+    "nearby_restaurants": _send_nearby_hint,
+}
 
 async def handle_restaurant_selection(user_number: str, choice: int, whatsapp_service, location_service, order_service):
     """Handle user's restaurant selection"""
@@ -605,16 +689,17 @@ async def handle_restaurant_selection(user_number: str, choice: int, whatsapp_se
         location_data = order_service.get_temporary_location(user_number)
         
         if not location_data:
-            whatsapp_service.send_text_message(
+            await whatsapp_service.send_text_message_async(
                 user_number, 
                 "❌ Location not found. Please share your location again."
             )
             return
         
-        # Get nearby options again
-        nearby_options = location_service.get_nearby_options(
-            location_data['lat'], location_data['lon']
-        )
+        # Reuse the options the user is choosing from; recompute if they're missing or older than the nearby-options TTL
+        nearby_options = location_data.get('options')
+        options_saved_at = location_data.get('options_saved_at')
+        if not nearby_options or options_saved_at is None or time.monotonic() - options_saved_at > NEARBY_OPTIONS_TTL:
+            nearby_options = location_service.get_nearby_options(location_data['lat'], location_data['lon'])
         
         if 1 <= choice <= len(nearby_options):
             selected_restaurant = nearby_options[choice - 1]
@@ -636,22 +721,22 @@ async def handle_restaurant_selection(user_number: str, choice: int, whatsapp_se
                         selected_restaurant['distance_km']
                     )
                     
-                    whatsapp_service.send_text_message(user_number, order_summary)
-                    order_service.save_conversation(user_number, "bot", order_summary)
-                    
-                    # Ask for confirmation
-                    confirm_msg = "✅ Type 'confirm' to place order\n❌ Type 'cancel' to cancel"
-                    whatsapp_service.send_text_message(user_number, confirm_msg)
-                    order_service.update_user_state(user_number, "awaiting_confirmation")
+                    # Ask for confirmation in the same message as the summary
+                    summary_message = f"{order_summary}\n\n{_CONFIRM_PROMPT}"
+                    await _send_alongside(
+                        user_number, summary_message,
+                        lambda: order_service.update_user_state(user_number, "awaiting_confirmation")
+                    )
+                    order_service.save_conversation(user_number, "bot", summary_message)
                 else:
-                    whatsapp_service.send_text_message(
+                    await whatsapp_service.send_text_message_async(
                         user_number, 
                         "❌ No pending order found. Please place an order first."
                     )
             
             else:
                 # For other restaurants, show menu request option
-                whatsapp_service.send_text_message(
+                await whatsapp_service.send_text_message_async(
                     user_number,
                     f"🍽️ You selected: **{selected_restaurant['name']}**\n"
                     f"📍 {selected_restaurant['distance_km']} km away\n\n"
@@ -664,58 +749,73 @@ async def handle_restaurant_selection(user_number: str, choice: int, whatsapp_se
                 order_service.update_user_state(user_number, "new")
         
         else:
-            whatsapp_service.send_text_message(
+            await whatsapp_service.send_text_message_async(
                 user_number,
                 f"❌ Invalid choice. Please select a number between 1-{len(nearby_options)}"
             )
     
     except Exception as e:
-        logger.error(f"❌ Error handling restaurant selection: {e}")
-        whatsapp_service.send_text_message(
+        logger.error("❌ Error handling restaurant selection: %s", e)
+        await whatsapp_service.send_text_message_async(
             user_number, 
             "❌ Error processing selection. Please try again."
         )
 
+# Nearby search result rows - parsed once instead of rebuilt with += per option
+_NEARBY_BRANCH_ROW = (
+    "{i}. **{name}**\n"
+    "   📍 {distance_km:.1f} km | ⭐ {rating} | ⏰ {delivery_time}\n"
+    "   🍽️ {cuisine}\n"
+    "   📞 {phone}\n\n"
+)
+_NEARBY_RESTAURANT_ROW = (
+    "{i}. **{name}**\n"
+    "   📍 {distance_km:.1f} km | 🍽️ {cuisine}\n"
+    "   🚚 Estimated: {delivery_time}\n\n"
+)
+_NEARBY_RESULTS_FOOTER = (
+    "💡 **How to order:**\n"
+    "To order from FoodExpress, select our branches (🏪) by typing the number.\n"
+    "Example: Type '1' to order from FoodExpress Karachi\n\n"
+    "📍 View on map: https://www.openstreetmap.org/"
+)
+
 async def handle_nearby_search(message_text: str, user_number: str, whatsapp_service, location_service, order_service):
     """Handle nearby restaurant search - FIXED VERSION"""
     try:
         # Extract search query and location
-        if "nearby:" in message_text.lower():
-            query_parts = message_text.lower().split("nearby:")[1].strip()
-        else:
-            query_parts = message_text.lower().replace("near me", "").replace("around me", "").strip()
-        
-        # Parse radius if specified
-        radius_km = 5.0  # default radius
-        if "within" in query_parts:
-            parts = query_parts.split("within")
-            if len(parts) >= 2:
-                location_part = parts[0].strip()
-                radius_part = parts[1].strip().replace("km", "").strip()
-                try:
-                    radius_km = float(radius_part)
-                except ValueError:
-                    radius_km = 5.0
-            else:
-                location_part = query_parts
+        message_lower = message_text.lower()
+        near_me = "nearby:" not in message_lower
+        if not near_me:
+            query_parts = message_lower.split("nearby:")[1].strip()
         else:
-            location_part = query_parts
+            query_parts = _NEAR_ME_RE.sub("", message_lower).strip()
         
-        # Clean up location part
-        location_part = location_part.strip()
+        # Parse radius if specified (default 5 km)
+        radius_km = 5.0
+        location_part = query_parts
+        radius_match = _NEARBY_RADIUS_RE.match(query_parts)
+        if radius_match:
+            location_part = radius_match["location"].strip()
+            if radius_match["radius"]:
+                radius_km = float(radius_match["radius"])
         
-        logger.info(f"🔍 Searching nearby for location: {location_part}, radius: {radius_km} km")
+        logger.info("🔍 Searching nearby for location: %s, radius: %s km", location_part, radius_km)
         
-        # Geocode the address instead of using fixed coordinates
-        lat, lon, formatted_address = location_service.geocode_address(location_part)
+        # "near me" (or an empty query) reuses the location the user already shared; otherwise geocode the address
+        saved_location = order_service.get_temporary_location(user_number) if near_me or not location_part else None
+        if saved_location:
+            lat, lon, formatted_address = saved_location['lat'], saved_location['lon'], saved_location['address']
+        else:
+            lat, lon, formatted_address = await _geocode(location_part)
         
         if lat and lon:
             # Get nearby options using LocationService
             nearby_options = location_service.get_nearby_options(lat, lon)
             
             if nearby_options:
-                # Format results
-                results_text = f"📍 **RESTAURANTS NEAR {formatted_address}** 📍\n\n"
+                # Format results - collect parts and join once
+                parts = [f"📍 **RESTAURANTS NEAR {formatted_address}** 📍\n\n"]
                 
                 our_branches = []
                 other_restaurants = []
@@ -729,49 +829,59 @@ async def handle_nearby_search(message_text: str, user_number: str, whatsapp_ser
                 
                 # Display our branches first
                 if our_branches:
-                    results_text += "🏪 **FOODEXPRESS BRANCHES** 🏪\n"
-                    for i, option in enumerate(our_branches, 1):
-                        results_text += f"{i}. **{option['name']}**\n"
-                        results_text += f"   📍 {option.get('distance_km', 0):.1f} km | ⭐ {option.get('rating', 4.0)} | ⏰ {option.get('delivery_time', '30-40 mins')}\n"
-                        results_text += f"   🍽️ {', '.join(option.get('cuisine', ['Pakistani']))}\n"
-                        results_text += f"   📞 {option.get('phone', 'N/A')}\n\n"
+                    parts.append("🏪 **FOODEXPRESS BRANCHES** 🏪\n")
+                    parts.extend(
+                        _NEARBY_BRANCH_ROW.format(
+                            i=i,
+                            name=option['name'],
+                            distance_km=option.get('distance_km', 0),
+                            rating=option.get('rating', 4.0),
+                            delivery_time=option.get('delivery_time', '30-40 mins'),
+                            cuisine=', '.join(option.get('cuisine', ['Pakistani'])),
+                            phone=option.get('phone', 'N/A')
+                        )
+                        for i, option in enumerate(our_branches, 1)
+                    )
                 
                 # Display other restaurants
                 if other_restaurants:
-                    results_text += "🏠 **OTHER RESTAURANTS** 🏠\n"
+                    parts.append("🏠 **OTHER RESTAURANTS** 🏠\n")
                     start_num = len(our_branches) + 1
-                    for i, option in enumerate(other_restaurants, start_num):
-                        results_text += f"{i}. **{option['name']}**\n"
-                        results_text += f"   📍 {option.get('distance_km', 0):.1f} km | 🍽️ {option.get('cuisine', 'Various')}\n"
-                        results_text += f"   🚚 Estimated: {option.get('delivery_time', '40-50 mins')}\n\n"
+                    parts.extend(
+                        _NEARBY_RESTAURANT_ROW.format(
+                            i=i,
+                            name=option['name'],
+                            distance_km=option.get('distance_km', 0),
+                            cuisine=option.get('cuisine', 'Various'),
+                            delivery_time=option.get('delivery_time', '40-50 mins')
+                        )
+                        for i, option in enumerate(other_restaurants, start_num)
+                    )
                 
-                results_text += "💡 **How to order:**\n"
-                results_text += "To order from FoodExpress, select our branches (🏪) by typing the number.\n"
-                results_text += "Example: Type '1' to order from FoodExpress Karachi\n\n"
-                results_text += "📍 View on map: https://www.openstreetmap.org/"
+                parts.append(_NEARBY_RESULTS_FOOTER)
+                results_text = "".join(parts)
                 
-                whatsapp_service.send_text_message(user_number, results_text)
+                # Update user state and save the location for restaurant selection while the results go out
+                await _send_alongside(
+                    user_number, results_text,
+                    lambda: order_service.update_user_state(user_number, "awaiting_restaurant_choice"),
+                    lambda: order_service.save_temporary_location(user_number, lat, lon, formatted_address, nearby_options)
+                )
                 order_service.save_conversation(user_number, "bot", results_text)
                 
-                # Update user state to wait for restaurant choice
-                order_service.update_user_state(user_number, "awaiting_restaurant_choice")
-                
-                # Save location temporarily for restaurant selection
-                order_service.save_temporary_location(user_number, lat, lon, formatted_address)
-                
             else:
                 error_msg = f"❌ No restaurants found near '{formatted_address}'. Try a different location."
-                whatsapp_service.send_text_message(user_number, error_msg)
+                await whatsapp_service.send_text_message_async(user_number, error_msg)
                 order_service.save_conversation(user_number, "bot", error_msg)
         else:
             error_msg = "❌ Could not find this location. Please provide a valid address."
-            whatsapp_service.send_text_message(user_number, error_msg)
+            await whatsapp_service.send_text_message_async(user_number, error_msg)
             order_service.save_conversation(user_number, "bot", error_msg)
     
     except Exception as e:
-        logger.error(f"❌ Error in nearby search: {e}")
+        logger.error("❌ Error in nearby search: %s", e)
         error_msg = "❌ Error searching nearby restaurants. Please try again with a different address."
-        whatsapp_service.send_text_message(user_number, error_msg)
+        await whatsapp_service.send_text_message_async(user_number, error_msg)
         order_service.save_conversation(user_number, "bot", error_msg)
 
 async def process_location_with_order(user_number: str, lat: float, lon: float, nearest_branch: dict, distance: float,
@@ -798,23 +908,22 @@ async def process_location_with_order(user_number: str, lat: float, lon: float,
                 nearest_branch['name'],
                 distance
             )
-            whatsapp_service.send_text_message(user_number, order_summary)
-            order_service.save_conversation(user_number, "bot", order_summary)
-            order_service.update_user_state(user_number, "awaiting_confirmation")
-            logger.info(f"📍 Address processed: {address}")
-            
-            # Send confirmation instructions
-            confirm_msg = "✅ Type 'confirm' to place order\n❌ Type 'cancel' to cancel"
-            whatsapp_service.send_text_message(user_number, confirm_msg)
-            order_service.save_conversation(user_number, "bot", confirm_msg)
+            # Confirmation instructions go out with the summary - one send instead of two
+            summary_message = f"{order_summary}\n\n{_CONFIRM_PROMPT}"
+            await _send_alongside(
+                user_number, summary_message,
+                lambda: order_service.update_user_state(user_number, "awaiting_confirmation")
+            )
+            order_service.save_conversation(user_number, "bot", summary_message)
+            logger.info("📍 Address processed: %s", address)
         else:
             error_msg = "❌ Order update failed. Please try again."
-            whatsapp_service.send_text_message(user_number, error_msg)
+            await whatsapp_service.send_text_message_async(user_number, error_msg)
             order_service.save_conversation(user_number, "bot", error_msg)
     else:
         # No pending order found, ask user to place order first
         error_msg = "❌ No pending order found. Please place an order first."
-        whatsapp_service.send_text_message(user_number, error_msg)
+        await whatsapp_service.send_text_message_async(user_number, error_msg)
         order_service.save_conversation(user_number, "bot", error_msg)
 
 async def handle_interactive_message(message_data, user_number, whatsapp_service, order_service):
@@ -823,60 +932,51 @@ async def handle_interactive_message(message_data, user_number, whatsapp_service
     button_reply = interactive_data.get("button_reply", {})
     button_id = button_reply.get("id")
     
-    logger.info(f"🔘 Button clicked: {button_id}")
+    logger.info("🔘 Button clicked: %s", button_id)
     
-    if button_id == "order_food":
-        menu_items = order_service.get_menu_items()
-        menu_message = whatsapp_service.create_menu_list(menu_items)
-        whatsapp_service.send_text_message(user_number, menu_message)
-        order_service.save_conversation(user_number, "bot", menu_message)
-    
-    elif button_id == "track_order":
-        track_message = "📦 To track your order, please provide your order ID.\nExample: 'track order 1'"
-        whatsapp_service.send_text_message(user_number, track_message)
-        order_service.save_conversation(user_number, "bot", track_message)
-    
-    elif button_id == "branch_info":
-        branches_info = order_service.get_branches_info()
-        whatsapp_service.send_text_message(user_number, branches_info)
-        order_service.save_conversation(user_number, "bot", branches_info)
-    
-    elif button_id == "nearby_restaurants":
-        response_msg = "📍 To find nearby restaurants, please share your location or type your address.\nExample: 'coffee near me' or 'location: Gulshan, Karachi'"
-        whatsapp_service.send_text_message(user_number, response_msg)
-        order_service.save_conversation(user_number, "bot", response_msg)
+    handler = _BUTTON_HANDLERS.get(button_id)
+    if handler:
+        await handler(user_number, "", "", whatsapp_service, nlp_service, order_service)
 
 @router.get("/conversations/{phone_number}")
-async def get_conversations(phone_number: str, db: Session = Depends(get_db)):
-    """Get conversation history for a phone number"""
-    order_service = OrderService(db)
-    conversations = order_service.get_conversations(phone_number)
-    return {"phone_number": phone_number, "conversations": conversations}
+async def get_conversations(
+    phone_number: str,
+    limit: int = Query(DEFAULT_HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    before: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get conversation history for a phone number, one page at a time"""
+    conversations = await fetch_conversations(db, phone_number, limit=limit, before=before)
+    # Oldest message on this page is the cursor for the next (older) page
+    next_before = conversations[0]["timestamp"] if len(conversations) == limit else None
+    return {"phone_number": phone_number, "conversations": conversations, "next_before": next_before}
 
 @router.get("/orders/{phone_number}")
-async def get_orders(phone_number: str, db: Session = Depends(get_db)):
-    """Get order history for a phone number"""
-    order_service = OrderService(db)
-    orders = order_service.get_orders_by_phone(phone_number)
-    return {"phone_number": phone_number, "orders": orders}
+async def get_orders(
+    phone_number: str,
+    limit: int = Query(DEFAULT_HISTORY_PAGE_SIZE, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    before: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get order history for a phone number, newest first, one page at a time"""
+    orders = await fetch_orders_by_phone(db, phone_number, limit=limit, before=before)
+    next_before = orders[-1]["created_at"] if len(orders) == limit else None
+    return {"phone_number": phone_number, "orders": orders, "next_before": next_before}
 
 @router.get("/whatsapp/health")
 async def whatsapp_health_check():
     """Check WhatsApp service health"""
-    whatsapp_service = WhatsAppService()
     health_status = whatsapp_service.check_whatsapp_health()
     return health_status
 
 @router.post("/whatsapp/send-test")
-async def send_test_message(request: Request):
+async def send_test_message(request_data: TestMessageRequest):
     """Send test WhatsApp message"""
     try:
-        body = await request.json()
-        phone_number = body.get("phone_number", "923001234567")
-        message = body.get("message", "Test message from FoodExpress Pakistan")
+        phone_number = request_data.phone_number
+        message = request_data.message
         
-        whatsapp_service = WhatsAppService()
-        result = whatsapp_service.send_text_message(phone_number, message)
+        result = await whatsapp_service.send_text_message_async(phone_number, message)
         
         return {
             "status": "success",
@@ -909,57 +1009,66 @@ async def get_user_state(phone_number: str, db: Session = Depends(get_db)):
             "pending_order": pending_order
         }
     except Exception as e:
-        logger.error(f"❌ Error getting user state: {e}")
+        logger.error("❌ Error getting user state: %s", e)
         return {"phone_number": phone_number, "state": "new", "pending_order": None}
 
+def _read_fresh_user_state(order_service: OrderService, phone_number: str) -> str:
+    """Read the user state past the session's identity map, so commits from the webhook's session show up"""
+    order_service.db.expire_all()
+    return order_service.get_user_state(phone_number)
+
+async def _wait_for_state_change(order_service: OrderService, phone_number: str, previous_state: str, timeout: float) -> str:
+    """Poll the user state without blocking the event loop until it changes or timeout passes"""
+    deadline = time.monotonic() + timeout
+    state = await asyncio.to_thread(_read_fresh_user_state, order_service, phone_number)
+    while state == previous_state and time.monotonic() < deadline:
+        await asyncio.sleep(STATE_POLL_INTERVAL)
+        state = await asyncio.to_thread(_read_fresh_user_state, order_service, phone_number)
+    return state
+
 @router.post("/webhook/confirm-address/{phone_number}")
 async def confirm_address(
     phone_number: str,
-    request_data: dict = Body(...),
+    request_data: ConfirmAddressRequest,
     db: Session = Depends(get_db)
 ):
     """Confirm or cancel address for pending order - FIXED FOR VOICE"""
     order_service = OrderService(db)
-    whatsapp_service = WhatsAppService()
     
     try:
         # Extract parameters from request body
-        address = request_data.get("address", "")
-        confirm = request_data.get("confirm", True)
+        address = request_data.address
+        confirm = request_data.confirm
         
-        logger.info(f"📍 Confirm address request: phone={phone_number}, address={address[:50]}..., confirm={confirm}")
+        logger.info("📍 Confirm address request: phone=%s, address=%.50s..., confirm=%s", phone_number, address, confirm)
         
         if confirm:
             # Get pending order
             pending_order = order_service.get_pending_order(phone_number)
             
             if pending_order:
+                initial_state = order_service.get_user_state(phone_number)
+                
                 # Prepare location message
                 location_message = f"location: {address}"
                 
                 # Send location message
-                logger.info(f"📍 Sending location message for voice order: {location_message[:50]}...")
-                send_result = whatsapp_service.send_text_message(phone_number, location_message)
+                logger.info("📍 Sending location message for voice order: %.50s...", location_message)
+                send_result = await whatsapp_service.send_text_message_async(phone_number, location_message)
                 
                 if send_result:
-                    # Wait for processing
-                    time.sleep(2)
-                    
-                    # Get updated user state
-                    user_state = order_service.get_user_state(phone_number)
-                    logger.info(f"📍 User state after location: {user_state}")
+                    # Wait for processing - up to 2s, returning as soon as the state moves on
+                    user_state = await _wait_for_state_change(order_service, phone_number, initial_state, timeout=2.0)
+                    logger.info("📍 User state after location: %s", user_state)
                     
                     if user_state == "awaiting_confirmation":
                         # Send confirmation automatically for voice orders
-                        logger.info(f"📍 Auto-confirming order for {phone_number}")
-                        confirm_result = whatsapp_service.send_text_message(phone_number, "confirm")
+                        logger.info("📍 Auto-confirming order for %s", phone_number)
+                        confirm_result = await whatsapp_service.send_text_message_async(phone_number, "confirm")
                         
                         if confirm_result:
                             # Wait for confirmation to process
-                            time.sleep(1)
-                            
-                            # Get final state
-                            final_state = order_service.get_user_state(phone_number)
+                            final_state = await _wait_for_state_change(order_service, phone_number, user_state, timeout=1.0)
                             
                             if final_state == "order_confirmed":
                                 return {
@@ -1014,7 +1123,7 @@ async def confirm_address(
                 }
                 
     except Exception as e:
-        logger.error(f"❌ Error confirming address: {e}")
+        logger.error("❌ Error confirming address: %s", e)
         return {
             "status": "error", 
             "message": f"Server error: {str(e)}"
@@ -1032,10 +1141,9 @@ async def process_voice_order(
 ):
     """Process voice order transcription"""
     order_service = OrderService(db)
-    nlp_service = NLPService()
     
     try:
-        logger.info(f"🎤 Processing voice order from {phone_number}: {transcription}")
+        logger.info("🎤 Processing voice order from %s: %s", phone_number, transcription)
         
         # Get menu items
         menu_items = order_service.get_menu_items()
@@ -1080,7 +1188,7 @@ async def process_voice_order(
             }
             
     except Exception as e:
-        logger.error(f"❌ Error processing voice order: {e}")
+        logger.error("❌ Error processing voice order: %s", e)
         return {
             "status": "error",
             "message": f"Server error: {str(e)}"
@@ -1109,7 +1217,7 @@ async def get_pending_voice_order(phone_number: str, db: Session = Depends(get_d
         }
         
     except Exception as e:
-        logger.error(f"❌ Error getting pending voice order: {e}")
+        logger.error("❌ Error getting pending voice order: %s", e)
         return {
             "phone_number": phone_number,
             "is_voice_order_pending": False,
@@ -1121,12 +1229,17 @@ async def get_pending_voice_order(phone_number: str, db: Session = Depends(get_d
 # STREAMLIT SUPPORT ENDPOINTS
 # =============================================================================
 
-@router.get("/menu")
+# Body is pre-serialized bytes, so the schema is declared for OpenAPI rather than via response_model
+@router.get("/menu", responses={200: {"model": MenuResponse}})
 async def get_menu_endpoint(db: Session = Depends(get_db)):
     """Get menu items for Streamlit frontend"""
-    order_service = OrderService(db)
-    menu_items = order_service.get_menu_items()
-    return {"menu": menu_items}
+    menu_version = get_menu_version()
+    menu_body = _menu_response_cache.get(menu_version)
+    if menu_body is None:
+        order_service = OrderService(db)
+        menu_body = orjson.dumps({"menu": order_service.get_menu_items()})
+        _menu_response_cache.set(menu_version, menu_body)
+    return Response(content=menu_body, media_type="application/json")
 
 @router.get("/health")
 async def health_check():
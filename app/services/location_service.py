@@ -4,15 +4,113 @@ import json
 import os
 from typing import List, Dict, Tuple, Optional
 from geopy.geocoders import Nominatim
+from geopy.extra.rate_limiter import RateLimiter
+from concurrent.futures import ThreadPoolExecutor
 import time
+import math
+import re
+import sqlite3
+import threading
+import numpy as np
+from app.utils.cache import TTLCache
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.geo import bounding_box_mask
+
+# Same mean earth radius the haversine package uses, so vectorized distances match it
+_EARTH_RADIUS_KM = 6371.0088
+
+# Geocode results keyed on the normalized address - Nominatim hits are stable, fallbacks may be a transient outage
+_geocode_cache = TTLCache(ttl=86400, maxsize=10000)
+_fallback_geocode_cache = TTLCache(ttl=300, maxsize=10000)
+# Nearby options keyed on coordinates rounded to 4 decimals (~11 m)
+NEARBY_OPTIONS_TTL = 900
+_nearby_options_cache = TTLCache(ttl=NEARBY_OPTIONS_TTL, maxsize=10000)
+
+# Nominatim answers persisted across restarts; a NULL latitude records an address Nominatim could not place
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', os.path.join('data', 'geocode_cache.sqlite'))
+_geocode_db = None
+_geocode_db_lock = threading.Lock()
+
+def normalize_address(address: str) -> str:
+    """Cache key for an address: lowercased with whitespace collapsed"""
+    return " ".join(address.lower().split())
+
+def _get_geocode_db() -> sqlite3.Connection:
+    """Open the geocode cache database on first use"""
+    global _geocode_db
+    if _geocode_db is None:
+        cache_dir = os.path.dirname(GEOCODE_CACHE_PATH)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        _geocode_db = sqlite3.connect(GEOCODE_CACHE_PATH, check_same_thread=False)
+        _geocode_db.execute(
+            "CREATE TABLE IF NOT EXISTS geocode_cache "
+            "(addr TEXT PRIMARY KEY, lat REAL, lon REAL, display TEXT)"
+        )
+        _geocode_db.commit()
+    return _geocode_db
+
+def _load_stored_geocode(key: str) -> Optional[Tuple[Optional[float], Optional[float], Optional[str]]]:
+    """Return the stored (lat, lon, display) row for an address, or None if it was never looked up"""
+    try:
+        with _geocode_db_lock:
+            return _get_geocode_db().execute(
+                "SELECT lat, lon, display FROM geocode_cache WHERE addr = ?", (key,)
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"   ⚠️ Geocode cache read failed: {e}")
+        return None
+
+def _store_geocode(key: str, lat: Optional[float], lon: Optional[float], display: Optional[str]):
+    """Persist a Nominatim answer - pass lat=None to record that the address was not found"""
+    try:
+        with _geocode_db_lock:
+            db = _get_geocode_db()
+            db.execute(
+                "INSERT OR REPLACE INTO geocode_cache (addr, lat, lon, display) VALUES (?, ?, ?, ?)",
+                (key, lat, lon, display)
+            )
+            db.commit()
+    except sqlite3.Error as e:
+        print(f"   ⚠️ Geocode cache write failed: {e}")
+
+# City fallback coordinates, in match priority order when an address names more than one city
+_CITY_TABLE = {
+    'karachi': (24.8607, 67.0011, "Karachi, Pakistan"),
+    'lahore': (31.5204, 74.3587, "Lahore, Pakistan"),
+    'islamabad': (33.738045, 73.084488, "Islamabad, Pakistan"),
+    'rawalpindi': (33.5651, 73.0169, "Rawalpindi, Pakistan"),
+    'faisalabad': (31.4504, 73.1350, "Faisalabad, Pakistan"),
+    'multan': (30.1575, 71.5249, "Multan, Pakistan"),
+    'peshawar': (34.0151, 71.5249, "Peshawar, Pakistan"),
+    'quetta': (30.1798, 66.9750, "Quetta, Pakistan"),
+    'hyderabad': (25.3960, 68.3578, "Hyderabad, Pakistan"),
+}
+_CITY_PRIORITY = {city: rank for rank, city in enumerate(_CITY_TABLE)}
+# Substring matches, same as the old `in` checks ('pak' also covers 'pakistan')
+_CITY_RE = re.compile('|'.join(_CITY_TABLE), re.IGNORECASE)
+_PAKISTAN_RE = re.compile('pak|pk', re.IGNORECASE)
+
+# While Nominatim keeps failing, go straight to the city fallback instead of waiting out its timeouts
+geocode_breaker = CircuitBreaker("geocoder", fail_max=5, reset_timeout=30)
 
 class LocationService:
     def __init__(self):
         self.branches = self.get_default_branches()  # CHANGED from load_branches() to get_default_branches()
+        # Branch coordinates as arrays, so distances to all branches are one vectorized pass
+        self._branch_lat = np.array([b['latitude'] for b in self.branches], dtype=np.float64)
+        self._branch_lon = np.array([b['longitude'] for b in self.branches], dtype=np.float64)
+        self._branch_lat_rad = np.radians(self._branch_lat)
+        self._branch_lon_rad = np.radians(self._branch_lon)
+        self._branch_cos_lat = np.cos(self._branch_lat_rad)  # branches are static - only the user's trig varies per query
         self.geolocator = Nominatim(
             user_agent="foodexpress_pakistan_v1.0",
             timeout=10
         )
+        # Batch lookups share one limiter so parallel workers still respect Nominatim's 1 request/second policy
+        self._rate_limited_geocode = RateLimiter(
+            self.geolocator.geocode, min_delay_seconds=1.0, max_retries=0, swallow_exceptions=False
+        )
     
     def get_default_branches(self):  # NEW METHOD
         """Return default branches"""
@@ -55,16 +153,78 @@ class LocationService:
             }
         ]
     
-    def geocode_address(self, address: str) -> Tuple[Optional[float], Optional[float], str]:
-        """Convert address to coordinates using OpenStreetMap Nominatim - FIXED"""
+    def geocode_batch(self, addresses: List[str], max_workers: int = 4) -> Dict[str, Tuple[Optional[float], Optional[float], str]]:
+        """Geocode many addresses in parallel, returning results keyed by address in input order"""
+        # One lookup per normalized address; cached ones are answered without a worker
+        unique = {}
+        for address in addresses:
+            unique.setdefault(normalize_address(address), address)
+        
+        results = {}
+        pending = {}
+        for key, address in unique.items():
+            cached = _geocode_cache.get(key) or _fallback_geocode_cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending[key] = address
+        
+        if pending:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    key: executor.submit(self.geocode_address, address, self._rate_limited_geocode)
+                    for key, address in pending.items()
+                }
+                for key, future in futures.items():
+                    results[key] = future.result()
+        
+        return {address: results[normalize_address(address)] for address in addresses}
+    
+    def geocode_address(self, address: str, geocode=None) -> Tuple[Optional[float], Optional[float], str]:
+        """Convert address to coordinates, reusing cached results for repeated addresses"""
+        cache_key = normalize_address(address)
+        cached = _geocode_cache.get(cache_key) or _fallback_geocode_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        stored = _load_stored_geocode(cache_key)
+        if stored is not None:
+            lat, lon, display = stored
+            # A stored miss goes straight to the city fallback without asking Nominatim again
+            result = (lat, lon, display) if lat is not None else self._fallback_geocode(address)
+            _geocode_cache.set(cache_key, result)
+            return result
+        
+        result, source = self._geocode_uncached(address, geocode)
+        if source == "geocoder":
+            _store_geocode(cache_key, *result)
+            _geocode_cache.set(cache_key, result)
+        elif source == "not_found":
+            _store_geocode(cache_key, None, None, None)
+            _geocode_cache.set(cache_key, result)
+        else:
+            _fallback_geocode_cache.set(cache_key, result)
+        return result
+    
+    def _geocode_uncached(self, address: str, geocode=None) -> Tuple[Tuple[Optional[float], Optional[float], str], str]:
+        """Convert address to coordinates using OpenStreetMap Nominatim - FIXED
+        
+        Returns the coordinates and where they came from: "geocoder" for a Nominatim match,
+        "not_found" when Nominatim answered without a match, "fallback" when it could not be reached.
+        geocode overrides the Nominatim call, e.g. with the rate-limited one used for batches.
+        """
+        geocode = geocode or self.geolocator.geocode
         try:
             # Clean and prepare address
             address = address.strip()
             
             # Add Pakistan if not specified
-            if not any(word in address.lower() for word in ['pakistan', 'pak', 'pk']):
+            if not _PAKISTAN_RE.search(address):
                 address = f"{address}, Pakistan"
             
+            if not geocode_breaker.allow_request():
+                return self._fallback_geocode(address), "fallback"
+            
             print(f"📍 Attempting to geocode: {address[:50]}...")
             
             # Try with different formats
@@ -75,64 +235,60 @@ class LocationService:
                 address.split(',')[0] + ', Pakistan' if ',' in address else address
             ]
             
+            geocoder_failed = False
             for addr_variation in variations[:2]:  # Try only first 2 variations
                 try:
-                    location = self.geolocator.geocode(addr_variation, exactly_one=True, timeout=5)
+                    location = geocode(addr_variation, exactly_one=True, timeout=5)
+                    geocode_breaker.record_success()
                     if location:
                         print(f"   ✅ Geocoded: {addr_variation[:50]}... -> {location.latitude}, {location.longitude}")
-                        return location.latitude, location.longitude, location.address
+                        return (location.latitude, location.longitude, location.address), "geocoder"
                 except Exception as e:
+                    geocoder_failed = True
+                    geocode_breaker.record_failure()
                     print(f"   ⚠️ Geocoding variation failed: {e}")
                     continue
             
             # Fallback to city-based coordinates
-            return self._fallback_geocode(address)
+            return self._fallback_geocode(address), "fallback" if geocoder_failed else "not_found"
                 
         except Exception as e:
             print(f"❌ Geocoding error: {e}")
-            return self._fallback_geocode(address)
+            return self._fallback_geocode(address), "fallback"
     
     def _fallback_geocode(self, address: str) -> Tuple[float, float, str]:
         """Fallback geocoding for common Pakistani cities - FIXED"""
-        address_lower = address.lower()
+        cities = _CITY_RE.findall(address)
+        if cities:
+            city = min((c.lower() for c in cities), key=_CITY_PRIORITY.__getitem__)
+            return _CITY_TABLE[city]
         
-        if 'karachi' in address_lower:
-            return 24.8607, 67.0011, "Karachi, Pakistan"
-        elif 'lahore' in address_lower:
-            return 31.5204, 74.3587, "Lahore, Pakistan"
-        elif 'islamabad' in address_lower:
-            return 33.738045, 73.084488, "Islamabad, Pakistan"
-        elif 'rawalpindi' in address_lower:
-            return 33.5651, 73.0169, "Rawalpindi, Pakistan"
-        elif 'faisalabad' in address_lower:
-            return 31.4504, 73.1350, "Faisalabad, Pakistan"
-        elif 'multan' in address_lower:
-            return 30.1575, 71.5249, "Multan, Pakistan"
-        elif 'peshawar' in address_lower:
-            return 34.0151, 71.5249, "Peshawar, Pakistan"
-        elif 'quetta' in address_lower:
-            return 30.1798, 66.9750, "Quetta, Pakistan"
-        elif 'hyderabad' in address_lower:
-            return 25.3960, 68.3578, "Hyderabad, Pakistan"
-        else:
-            # Default to Karachi
-            print(f"   ⚠️ Could not geocode '{address[:30]}...', defaulting to Karachi")
-            return 24.8607, 67.0011, "Karachi, Pakistan (Default)"
+        # Default to Karachi
+        print(f"   ⚠️ Could not geocode '{address[:30]}...', defaulting to Karachi")
+        return 24.8607, 67.0011, "Karachi, Pakistan (Default)"
+    
+    def _branch_distances(self, user_lat: float, user_lon: float, indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """Haversine distance in km from the user to every branch (or just those at indices), in self.branches order"""
+        branch_lat_rad, branch_lon_rad, branch_cos_lat = self._branch_lat_rad, self._branch_lon_rad, self._branch_cos_lat
+        if indices is not None:
+            branch_lat_rad, branch_lon_rad, branch_cos_lat = branch_lat_rad[indices], branch_lon_rad[indices], branch_cos_lat[indices]
+        lat_rad = math.radians(user_lat)
+        lon_rad = math.radians(user_lon)
+        a = (np.sin((branch_lat_rad - lat_rad) / 2) ** 2
+             + math.cos(lat_rad) * branch_cos_lat * np.sin((branch_lon_rad - lon_rad) / 2) ** 2)
+        return 2 * _EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
     
     def find_nearest_branch(self, user_lat: float, user_lon: float, max_distance_km: float = 50.0):
         """Find nearest restaurant branch within maximum distance"""
         nearest_branch = None
         min_distance = float('inf')
         
-        for branch in self.branches:
-            branch_coords = (branch['latitude'], branch['longitude'])
-            user_coords = (user_lat, user_lon)
-            
-            distance = haversine(user_coords, branch_coords)
-            
-            if distance < min_distance and distance <= max_distance_km:
-                min_distance = distance
-                nearest_branch = branch
+        if self.branches:
+            distances = self._branch_distances(user_lat, user_lon)
+            nearest_index = int(np.argmin(distances))
+            if distances[nearest_index] <= max_distance_km:
+                min_distance = float(distances[nearest_index])
+                nearest_branch = self.branches[nearest_index]
         
         return nearest_branch, min_distance if nearest_branch else (None, None)
     
@@ -144,13 +300,19 @@ class LocationService:
             
             # Calculate distances to our branches
             nearby_branches = []
-            for branch in self.branches:
-                distance = haversine((user_lat, user_lon), (branch['latitude'], branch['longitude']))
-                if distance <= radius_km:
-                    branch_with_distance = branch.copy()
-                    branch_with_distance['distance_km'] = round(distance, 2)
-                    branch_with_distance['type'] = 'our_branch'
-                    nearby_branches.append(branch_with_distance)
+            # Box prefilter first - haversine only runs for branches that could be inside the radius
+            candidates = np.flatnonzero(
+                bounding_box_mask(self._branch_lat, self._branch_lon, user_lat, user_lon, radius_km)
+            )
+            distances = self._branch_distances(user_lat, user_lon, candidates)
+            within = distances <= radius_km
+            candidates, distances = candidates[within], distances[within]
+            # At most `limit` branches can make the final list - only copy the nearest ones
+            for position in np.argsort(np.round(distances, 2), kind='stable')[:limit]:
+                branch_with_distance = self.branches[candidates[position]].copy()
+                branch_with_distance['distance_km'] = round(float(distances[position]), 2)
+                branch_with_distance['type'] = 'our_branch'
+                nearby_branches.append(branch_with_distance)
             
             # Add some sample nearby restaurants
             sample_restaurants = [
@@ -211,7 +373,13 @@ class LocationService:
     
     def get_nearby_options(self, user_lat: float, user_lon: float):
         """Get all nearby options (our branches + sample restaurants)"""
-        return self.find_nearby_restaurants(user_lat, user_lon, radius_km=10, limit=8)
+        cache_key = (round(user_lat, 4), round(user_lon, 4))
+        nearby_options = _nearby_options_cache.get(cache_key)
+        if nearby_options is None:
+            nearby_options = self.find_nearby_restaurants(user_lat, user_lon, radius_km=10, limit=8)
+            if nearby_options:
+                _nearby_options_cache.set(cache_key, nearby_options)
+        return nearby_options
     
     def create_map_url(self, user_lat: float, user_lon: float, restaurants: List[Dict]):
         """Create OpenStreetMap URL with markers"""
@@ -260,4 +428,7 @@ class LocationService:
         for branch in self.branches:
             if branch['id'] == branch_id:
                 return branch
-        return None
\ No newline at end of file
+        return None
+
+# Global instance
+location_service = LocationService()
\ No newline at end of file
@@ -1,9 +1,13 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 from typing import List, Dict, Optional
 import logging
-from haversine import haversine
+from haversine import haversine_vector, Unit
+import numpy as np
 import json
+from app.utils.geo import bounding_box_mask
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +15,12 @@ class NearbyRestaurantService:
     def __init__(self):
         self.google_places_api_key = os.getenv("GOOGLE_PLACES_API_KEY", "")
         self.use_google_api = bool(self.google_places_api_key)
+        # Pooled keep-alive session so repeat Places lookups skip the TCP/TLS handshake
+        self._http = requests.Session()
+        self._http.mount('https://', HTTPAdapter(
+            pool_connections=4, pool_maxsize=8,
+            max_retries=Retry(total=2, backoff_factor=0.3)
+        ))
         
         # Our restaurant database (you can expand this)
         self.restaurant_database = [
@@ -80,36 +90,49 @@ class NearbyRestaurantService:
                 "is_open": True
             }
         ]
+        # (lat, lon) rows for all restaurants, so distances are one vectorized haversine call per query
+        self._restaurant_coords = np.array(
+            [(r['latitude'], r['longitude']) for r in self.restaurant_database], dtype=np.float64
+        ).reshape(-1, 2)
+        # Lowercased cuisines per restaurant, in the same order, for the cuisine filter
+        self._cuisines_lower = [frozenset(c.lower() for c in r['cuisine']) for r in self.restaurant_database]
     
     def find_nearby_restaurants(self, user_lat: float, user_lon: float, radius_km: float = 5.0, 
                                 cuisine_filter: Optional[str] = None, max_results: int = 10) -> List[Dict]:
         """Find restaurants near user location"""
         nearby_restaurants = []
+        if not self.restaurant_database:
+            return nearby_restaurants
         
-        for restaurant in self.restaurant_database:
-            # Calculate distance
-            restaurant_coords = (restaurant['latitude'], restaurant['longitude'])
-            user_coords = (user_lat, user_lon)
-            
-            distance = haversine(user_coords, restaurant_coords)
-            
-            # Check if within radius
-            if distance <= radius_km:
-                restaurant_copy = restaurant.copy()
-                restaurant_copy['distance_km'] = round(distance, 2)
-                restaurant_copy['distance_text'] = self._format_distance(distance)
-                
-                # Apply cuisine filter if provided
-                if cuisine_filter:
-                    if cuisine_filter.lower() in [c.lower() for c in restaurant['cuisine']]:
-                        nearby_restaurants.append(restaurant_copy)
-                else:
-                    nearby_restaurants.append(restaurant_copy)
+        # Box prefilter first, then distances to the surviving restaurants at once
+        candidates = np.flatnonzero(bounding_box_mask(
+            self._restaurant_coords[:, 0], self._restaurant_coords[:, 1], user_lat, user_lon, radius_km
+        ))
+        if candidates.size == 0:
+            return nearby_restaurants
+        distances = haversine_vector(
+            np.array([(user_lat, user_lon)]), self._restaurant_coords[candidates], Unit.KILOMETERS, comb=True
+        ).ravel()
+        
+        within = distances <= radius_km
+        candidates, distances = candidates[within], distances[within]
+        
+        # Apply cuisine filter if provided
+        if cuisine_filter:
+            cuisine_lower = cuisine_filter.lower()
+            keep = np.array([cuisine_lower in self._cuisines_lower[index] for index in candidates], dtype=bool)
+            candidates, distances = candidates[keep], distances[keep]
         
-        # Sort by distance
-        nearby_restaurants.sort(key=lambda x: x['distance_km'])
+        # Sort by distance and only copy the rows that make the cut
+        order = np.argsort(np.round(distances, 2), kind='stable')[:max_results]
+        for position in order:
+            distance = float(distances[position])
+            restaurant_copy = self.restaurant_database[candidates[position]].copy()
+            restaurant_copy['distance_km'] = round(distance, 2)
+            restaurant_copy['distance_text'] = self._format_distance(distance)
+            nearby_restaurants.append(restaurant_copy)
         
-        return nearby_restaurants[:max_results]
+        return nearby_restaurants
     
     def find_nearby_restaurants_google(self, user_lat: float, user_lon: float, radius_meters: int = 5000,
                                       cuisine_type: Optional[str] = None) -> List[Dict]:
@@ -132,7 +155,7 @@ class NearbyRestaurantService:
             if cuisine_type:
                 params["keyword"] = cuisine_type
             
-            response = requests.get(base_url, params=params, timeout=10)
+            response = self._http.get(base_url, params=params, timeout=(3, 10))
             data = response.json()
             
             restaurants = []
@@ -1,12 +1,28 @@
 from transformers import pipeline
 import re
 import json
+import functools
 from difflib import SequenceMatcher
 from typing import List, Dict, Tuple, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _keyword_re(words) -> re.Pattern:
+    """One precompiled alternation matching any of the words as a substring"""
+    return re.compile("|".join(re.escape(word) for word in words))
+
+# Rule-based intents in priority order - first match wins, anything else is an order
+_RULE_INTENTS = (
+    ("nearby_restaurants", _keyword_re(['nearby', 'close to', 'near me', 'around me', 'restaurants near'])),
+    ("place_order", _keyword_re(['order', 'want', 'need', 'would like', 'can i have', 'give me', 'i want'])),
+    ("track_order", _keyword_re(['track', 'status', 'where is', 'when will', 'order status'])),
+    ("branch_info", _keyword_re(['branch', 'shop', 'location', 'outlet', 'address', 'branches'])),
+    ("help", _keyword_re(['help', 'support', 'problem', 'issue'])),
+    ("greeting", _keyword_re(['hello', 'hi', 'hey', 'start', 'good'])),
+    ("get_menu", _keyword_re(['menu', 'items', 'list', 'what do you have', 'offer', 'whats available'])),
+)
+
 class NLPService:
     def __init__(self):
         # Define predefined variations BEFORE they're used
@@ -55,9 +71,28 @@ class NLPService:
         
         # Build food keywords from menu items
         self.food_keywords = self.build_food_keywords()
+        # Lowercased keyword -> menu names that list it (in food_keywords order), for exact keyword matches
+        self._keyword_index = {}
+        for menu_item_name, keywords in self.food_keywords.items():
+            for keyword in keywords:
+                self._keyword_index.setdefault(keyword.lower(), []).append(menu_item_name)
+        # "<qty> <keyword>" patterns for keyword matching, compiled once instead of per message
+        self._keyword_quantity_res = {
+            keyword: re.compile(r'(\d+)\s*' + re.escape(keyword))
+            for keywords in self.food_keywords.values()
+            for keyword in keywords
+        }
+        # Lowercased menu name -> canonical name (first one wins, like the old linear scan)
+        self._menu_names_by_lower = {}
+        for menu_item in self.menu_items:
+            self._menu_names_by_lower.setdefault(menu_item['name'].lower(), menu_item['name'])
         
         # Build menu priority based on popularity
         self.menu_priority = self.build_menu_priority()
+        
+        # Menu data is fixed after init, so intent and item extraction depend only on the text - memoize both
+        self._intent_cache = functools.lru_cache(maxsize=4096)(self._detect_intent_uncached)
+        self._items_cache = functools.lru_cache(maxsize=4096)(self._extract_items_uncached)
 
     def load_menu_from_scraper(self) -> List[Dict]:
         """Load menu from the scraper or use default"""
@@ -178,6 +213,10 @@ class NLPService:
         return {k: v for k, v in priority_items.items() if k in menu_names}
 
     def detect_intent(self, message: str) -> str:
+        """Detect user intent (memoized per normalized message)"""
+        return self._intent_cache(message.lower().strip())
+
+    def _detect_intent_uncached(self, message: str) -> str:
         """Detect user intent using HuggingFace Zero-shot Classification"""
         message_lower = message.lower().strip()
         
@@ -227,24 +266,20 @@ class NLPService:
         message_lower = message.lower()
         
         # Check for specific patterns
-        if any(word in message_lower for word in ['nearby', 'close to', 'near me', 'around me', 'restaurants near']):
-            return "nearby_restaurants"
-        elif any(word in message_lower for word in ['order', 'want', 'need', 'would like', 'can i have', 'give me', 'i want']):
-            return "place_order"
-        elif any(word in message_lower for word in ['track', 'status', 'where is', 'when will', 'order status']):
-            return "track_order" 
-        elif any(word in message_lower for word in ['branch', 'shop', 'location', 'outlet', 'address', 'branches']):
-            return "branch_info"
-        elif any(word in message_lower for word in ['help', 'support', 'problem', 'issue']):
-            return "help"
-        elif any(word in message_lower for word in ['hello', 'hi', 'hey', 'start', 'good']):
-            return "greeting"
-        elif any(word in message_lower for word in ['menu', 'items', 'list', 'what do you have', 'offer', 'whats available']):
-            return "get_menu"
-        else:
-            return "place_order"
+        for intent, keywords_re in _RULE_INTENTS:
+            if keywords_re.search(message_lower):
+                return intent
+        return "place_order"
 
     def extract_order_items(self, message: str) -> List[Dict]:
+        """Extract food items and quantities (memoized per lowercased message)"""
+        # Hand out copies so callers can't modify the cached result
+        return [dict(item) for item in self._items_cache(message.lower())]
+
+    def _extract_items_uncached(self, message: str) -> Tuple[Dict, ...]:
+        return tuple(self._extract_order_items(message))
+
+    def _extract_order_items(self, message: str) -> List[Dict]:
         """Extract food items and quantities using advanced NLP"""
         message_lower = message.lower()
         
@@ -315,7 +350,7 @@ class NLPService:
                         self._add_or_update_item(items, item_name2, quantity2)
                         logger.info(f"   ✅ AND Pattern: {quantity2}x {item_name2}")
                 
-                elif pattern_type in ['quantity_item', 'i_want_pattern', 'give_me_pattern']:
+                elif pattern_type in ('quantity_item', 'i_want_pattern', 'give_me_pattern'):
                     quantity = int(match.group(1))
                     item_name = match.group(3) if pattern_type == 'quantity_item' else match.group(2)
                     item_name = item_name.strip()
@@ -368,8 +403,7 @@ class NLPService:
                 for keyword in keywords:
                     if keyword in message and menu_item_name not in matched_items:
                         # Check if there's a number before the keyword
-                        pattern = r'(\d+)\s*' + re.escape(keyword)
-                        number_match = re.search(pattern, message)
+                        number_match = self._keyword_quantity_res[keyword].search(message)
                         
                         if number_match:
                             quantity = int(number_match.group(1))
@@ -385,16 +419,8 @@ class NLPService:
 
     def _add_or_update_item(self, items: List[Dict], item_name: str, quantity: int):
         """Add or update item in the list (prevents duplicates)"""
-        # First, find the actual menu item name (case-insensitive)
-        actual_item_name = None
-        for menu_item in self.menu_items:
-            if menu_item['name'].lower() == item_name.lower():
-                actual_item_name = menu_item['name']
-                break
-        
-        if not actual_item_name:
-            # If not found in menu, use the provided name
-            actual_item_name = item_name
+        # First, find the actual menu item name (case-insensitive); if not in the menu, use the provided name
+        actual_item_name = self._menu_names_by_lower.get(item_name.lower(), item_name)
         
         # Check if item already exists
         for item in items:
@@ -460,9 +486,12 @@ class NLPService:
         
         # Create a mapping of menu items for faster lookup
         menu_map = {item['name']: item for item in menu_data}
+        menu_names_lower = {}
+        for menu_name in menu_map:
+            menu_names_lower.setdefault(menu_name.lower(), menu_name)
         
         for item in extracted_items:
-            best_match = self._find_best_menu_match(item['item'], menu_map)
+            best_match = self._find_best_menu_match(item['item'], menu_map, menu_names_lower)
             
             if best_match:
                 menu_item = menu_map[best_match]
@@ -482,21 +511,22 @@ class NLPService:
         logger.info(f"   📊 Result: {len(validated_items)} valid, {len(invalid_items)} invalid")
         return validated_items, invalid_items
 
-    def _find_best_menu_match(self, extracted: str, menu_map: Dict) -> Optional[str]:
+    def _find_best_menu_match(self, extracted: str, menu_map: Dict, menu_names_lower: Optional[Dict] = None) -> Optional[str]:
         """Find the best matching menu item using multiple strategies"""
         extracted_lower = extracted.lower()
         
         # Strategy 1: Direct exact match
-        for menu_name in menu_map.keys():
-            if extracted_lower == menu_name.lower():
-                return menu_name
+        if menu_names_lower is None:
+            menu_names_lower = {}
+            for menu_name in menu_map:
+                menu_names_lower.setdefault(menu_name.lower(), menu_name)
+        if extracted_lower in menu_names_lower:
+            return menu_names_lower[extracted_lower]
         
         # Strategy 2: Check if extracted is in keywords
-        for menu_name, keywords in self.food_keywords.items():
+        for menu_name in self._keyword_index.get(extracted_lower, ()):
             if menu_name in menu_map:  # Ensure menu item exists in current menu
-                for keyword in keywords:
-                    if extracted_lower == keyword.lower():
-                        return menu_name
+                return menu_name
         
         # Strategy 3: Substring match
         for menu_name in menu_map.keys():
@@ -1,18 +1,114 @@
-from sqlalchemy.orm import Session
-from app.models.database import User, Order, OrderItem, MenuItem, Branch, Conversation
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.database import User, Order, OrderItem, MenuItem, Branch, Conversation, bulk_log_messages
+from app.utils.cache import TTLCache, get_menu_version
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import logging
 import json
-import traceback
+import time
 
 # Logger setup
 logger = logging.getLogger(__name__)
 
+# Shared across OrderService instances: available menu keyed on the menu version. User state is
+# always read from the DB, since the order flow and confirm-address polling depend on it being current.
+# These caches are per process - the app is meant to run as a single uvicorn worker.
+_menu_items_cache = TTLCache(ttl=300, maxsize=1)
+# Location (and the nearby options shown for it) awaiting a restaurant choice - a new OrderService
+# is created per message, so this can't live on the instance; expires after 30 minutes
+_temp_location_cache = TTLCache(ttl=1800, maxsize=10000)
+# Formatted branch list - branches only change through setup scripts, so a short TTL is enough
+_branches_info_cache = TTLCache(ttl=300, maxsize=1)
+
+# Relationships _order_to_dict renders - order lists load them up front (2 queries total, no per-row lazy loads)
+_ORDER_DETAIL_LOADERS = (
+    joinedload(Order.branch),
+    selectinload(Order.order_items).joinedload(OrderItem.menu_item),
+)
+
+def _conversation_to_dict(conv: Conversation) -> Dict:
+    """Serialize a Conversation row for the API"""
+    return {
+        "id": conv.id,
+        "message_type": conv.message_type,
+        "message_text": conv.message_text,
+        "timestamp": conv.timestamp.isoformat(),
+        "phone_number": conv.phone_number
+    }
+
+def _order_to_dict(order: Order) -> Dict:
+    """Serialize an Order with its items and branch name for the API"""
+    order_items = []
+    for item in order.order_items:
+        order_items.append({
+            'name': item.menu_item.name,
+            'quantity': item.quantity,
+            'price': float(item.menu_item.price),
+            'total_price': float(item.menu_item.price * item.quantity)
+        })
+    
+    # Get branch info if available
+    branch_name = 'Not assigned'
+    if order.branch:
+        branch_name = order.branch.name
+    elif order.branch_info:
+        # Try to parse from branch_info JSON
+        try:
+            branch_data = json.loads(order.branch_info)
+            branch_name = branch_data.get('name', 'Not assigned')
+        except:
+            pass
+    
+    return {
+        'order_id': order.id,
+        'total_amount': float(order.total_amount),
+        'status': order.status,
+        'created_at': order.created_at.isoformat(),
+        'branch_name': branch_name,
+        'customer_address': order.customer_address,
+        'items': order_items
+    }
+
+async def fetch_conversations(session: AsyncSession, phone_number: str, limit: int = 50,
+                              before: Optional[datetime] = None) -> List[Dict]:
+    """Async read of a phone number's conversation history - the latest `limit` messages older than `before`"""
+    try:
+        query = select(Conversation).where(Conversation.phone_number == phone_number)
+        if before is not None:
+            query = query.where(Conversation.timestamp < before)
+        result = await session.scalars(query.order_by(Conversation.timestamp.desc()).limit(limit))
+        return [_conversation_to_dict(conv) for conv in reversed(result.all())]  # Reverse to get chronological order
+    except Exception as e:
+        logger.error(f"❌ Error getting conversations: {e}")
+        return []
+
+async def fetch_orders_by_phone(session: AsyncSession, phone_number: str, limit: Optional[int] = None,
+                               before: Optional[datetime] = None) -> List[Dict]:
+    """Async read of a phone number's orders, newest first - relationships are eager-loaded (no lazy loads under async)"""
+    try:
+        query = (
+            select(Order)
+            .options(*_ORDER_DETAIL_LOADERS)
+            .join(User, Order.user_id == User.id)
+            .where(User.phone_number == phone_number)
+        )
+        if before is not None:
+            query = query.where(Order.created_at < before)
+        result = await session.scalars(query.order_by(Order.created_at.desc()).limit(limit))
+        return [_order_to_dict(order) for order in result.unique().all()]
+    except Exception as e:
+        logger.error(f"❌ Error getting orders: {e}")
+        return []
+
 class OrderService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, batch_conversations: bool = False):
         self.db = db
-        self.temp_locations = {}  # Temporary location storage for restaurant selection
+        # When batching, save_conversation only queues rows; flush_conversations writes them in one commit
+        self.batch_conversations = batch_conversations
+        self._pending_conversations = []
+        self._conversation_user_ids = {}  # phone -> user id, so queued turns don't re-query the user
         self.temp_restaurant_choices = {}  # Temporary restaurant selections
     
     def get_user_state(self, phone_number: str) -> str:
@@ -62,18 +158,26 @@ class OrderService:
         return user
     
     def save_conversation(self, phone_number: str, message_type: str, message_text: str):
-        """Save conversation to database"""
+        """Save conversation to database (queued until flush_conversations when batching)"""
         try:
-            user = self.get_or_create_user(phone_number)
+            user_id = self._conversation_user_ids.get(phone_number)
+            if user_id is None:
+                user_id = self.get_or_create_user(phone_number).id
+                if self.batch_conversations:
+                    self._conversation_user_ids[phone_number] = user_id
+            
+            row = {
+                "user_id": user_id,
+                "message_type": message_type,
+                "message_text": message_text,
+                "phone_number": phone_number,
+                "timestamp": datetime.utcnow()
+            }
+            if self.batch_conversations:
+                self._pending_conversations.append(row)
+                return
             
-            conversation = Conversation(
-                user_id=user.id,
-                message_type=message_type,
-                message_text=message_text,
-                phone_number=phone_number,
-                timestamp=datetime.utcnow()
-            )
-            self.db.add(conversation)
+            self.db.add(Conversation(**row))
             self.db.commit()
             logger.info(f"💬 Conversation saved: {message_type} - {message_text[:50]}...")
             
@@ -81,6 +185,18 @@ class OrderService:
             logger.error(f"❌ Error saving conversation: {e}")
             self.db.rollback()
     
+    def flush_conversations(self):
+        """Write all queued conversation rows in a single transaction"""
+        if not self._pending_conversations:
+            return
+        rows, self._pending_conversations = self._pending_conversations, []
+        try:
+            bulk_log_messages(self.db, rows)
+            logger.info(f"💬 {len(rows)} conversation messages saved")
+        except Exception as e:
+            logger.error(f"❌ Error saving conversations: {e}")
+            self.db.rollback()
+    
     def get_conversations(self, phone_number: str, limit: int = 50) -> List[Dict]:
         """Get conversation history for a phone number"""
         try:
@@ -88,16 +204,7 @@ class OrderService:
                 Conversation.phone_number == phone_number
             ).order_by(Conversation.timestamp.desc()).limit(limit).all()
             
-            return [
-                {
-                    "id": conv.id,
-                    "message_type": conv.message_type,
-                    "message_text": conv.message_text,
-                    "timestamp": conv.timestamp.isoformat(),
-                    "phone_number": conv.phone_number
-                }
-                for conv in reversed(conversations)  # Reverse to get chronological order
-            ]
+            return [_conversation_to_dict(conv) for conv in reversed(conversations)]  # Reverse to get chronological order
         except Exception as e:
             logger.error(f"❌ Error getting conversations: {e}")
             return []
@@ -106,48 +213,22 @@ class OrderService:
         """Get all orders for a phone number"""
         try:
             user = self.get_or_create_user(phone_number)
-            orders = self.db.query(Order).filter(Order.user_id == user.id).order_by(Order.created_at.desc()).all()
-            
-            order_list = []
-            for order in orders:
-                order_items = []
-                for item in order.order_items:
-                    order_items.append({
-                        'name': item.menu_item.name,
-                        'quantity': item.quantity,
-                        'price': float(item.menu_item.price),
-                        'total_price': float(item.menu_item.price * item.quantity)
-                    })
-                
-                # Get branch info if available
-                branch_name = 'Not assigned'
-                if order.branch:
-                    branch_name = order.branch.name
-                elif order.branch_info:
-                    # Try to parse from branch_info JSON
-                    try:
-                        branch_data = json.loads(order.branch_info)
-                        branch_name = branch_data.get('name', 'Not assigned')
-                    except:
-                        pass
-                
-                order_list.append({
-                    'order_id': order.id,
-                    'total_amount': float(order.total_amount),
-                    'status': order.status,
-                    'created_at': order.created_at.isoformat(),
-                    'branch_name': branch_name,
-                    'customer_address': order.customer_address,
-                    'items': order_items
-                })
+            orders = self.db.query(Order).options(*_ORDER_DETAIL_LOADERS).filter(
+                Order.user_id == user.id
+            ).order_by(Order.created_at.desc()).all()
             
-            return order_list
+            return [_order_to_dict(order) for order in orders]
         except Exception as e:
             logger.error(f"❌ Error getting orders: {e}")
             return []
     
     def get_menu_items(self) -> List[Dict]:
         """Get all available menu items - FILTERED"""
+        menu_version = get_menu_version()
+        cached_menu = _menu_items_cache.get(menu_version)
+        if cached_menu is not None:
+            return cached_menu
+        
         items = self.db.query(MenuItem).filter(
             MenuItem.is_available == True,
             MenuItem.name != 'string',
@@ -165,6 +246,7 @@ class OrderService:
             for item in items
         ]
         logger.info(f"📋 Retrieved {len(menu_list)} valid menu items")
+        _menu_items_cache.set(menu_version, menu_list)
         return menu_list
     
     def create_temporary_order(self, phone_number: str, items: List[Dict]) -> Optional[Order]:
@@ -230,8 +312,7 @@ class OrderService:
             
         except Exception as e:
             self.db.rollback()
-            logger.error(f"❌ Error creating temporary order: {e}")
-            traceback.print_exc()
+            logger.exception(f"❌ Error creating temporary order: {e}")
             return None
     
     def update_order_with_location(self, phone_number: str, lat: float, lon: float, 
@@ -368,6 +449,10 @@ class OrderService:
     
     def get_branches_info(self) -> str:
         """Get formatted branches information"""
+        cached_text = _branches_info_cache.get("branches_info")
+        if cached_text is not None:
+            return cached_text
+        
         branches = self.db.query(Branch).filter(Branch.is_active == True).all()
         
         if not branches:
@@ -379,6 +464,7 @@ class OrderService:
             branches_text += f"🏠 {branch.address}\n"
             branches_text += f"📞 {branch.phone_number}\n\n"
         
+        _branches_info_cache.set("branches_info", branches_text)
         return branches_text
     
     def get_order_status(self, phone_number: str, order_id: int) -> Optional[str]:
@@ -475,28 +561,22 @@ class OrderService:
 
     # NEW METHODS FOR RESTAURANT SELECTION AND LOCATION MANAGEMENT
     
-    def save_temporary_location(self, phone_number: str, lat: float, lon: float, address: str):
-        """Save location temporarily for restaurant selection"""
-        self.temp_locations[phone_number] = {
+    def save_temporary_location(self, phone_number: str, lat: float, lon: float, address: str,
+                                options: Optional[List[Dict]] = None):
+        """Save location (and the nearby options listed for it) temporarily for restaurant selection"""
+        _temp_location_cache.set(phone_number, {
             'lat': lat,
             'lon': lon,
             'address': address,
+            'options': options,
+            'options_saved_at': time.monotonic(),  # lets readers tell when the options have gone stale
             'timestamp': datetime.utcnow()
-        }
+        })
         logger.info(f"📍 Saved temporary location for {phone_number}: {lat}, {lon}")
     
     def get_temporary_location(self, phone_number: str) -> Optional[Dict]:
-        """Get saved temporary location"""
-        location = self.temp_locations.get(phone_number)
-        if location:
-            # Check if location is still valid (less than 30 minutes old)
-            time_diff = datetime.utcnow() - location['timestamp']
-            if time_diff.total_seconds() < 1800:  # 30 minutes
-                return location
-            else:
-                # Remove expired location
-                del self.temp_locations[phone_number]
-        return None
+        """Get saved temporary location (None once older than 30 minutes)"""
+        return _temp_location_cache.get(phone_number)
     
     def save_restaurant_choice(self, phone_number: str, restaurant_data: Dict):
         """Save user's restaurant choice temporarily"""
@@ -584,8 +664,8 @@ class OrderService:
     
     def clear_temporary_data(self, phone_number: str):
         """Clear temporary stored data"""
-        if phone_number in self.temp_locations:
-            del self.temp_locations[phone_number]
+        if _temp_location_cache.get(phone_number) is not None:
+            _temp_location_cache.delete(phone_number)
             logger.info(f"🗑️ Cleared temporary location for {phone_number}")
         
         if phone_number in self.temp_restaurant_choices:
@@ -662,7 +742,7 @@ class OrderService:
         """Get user's order history with details"""
         try:
             user = self.get_or_create_user(phone_number)
-            orders = self.db.query(Order).filter(
+            orders = self.db.query(Order).options(*_ORDER_DETAIL_LOADERS).filter(
                 Order.user_id == user.id,
                 Order.status.in_(["confirmed", "completed", "delivered"])
             ).order_by(Order.created_at.desc()).limit(limit).all()
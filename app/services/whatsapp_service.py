@@ -1,14 +1,37 @@
 import json
 import requests
+import httpx
 from fastapi import HTTPException
 import os
 from typing import Dict, List, Optional
 import logging
+from app.utils.circuit_breaker import CircuitBreaker
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# One keep-alive HTTP/2 pool shared by every WhatsAppService instance for async sends
+_async_client: Optional[httpx.AsyncClient] = None
+
+def get_async_client() -> httpx.AsyncClient:
+    """Get (or lazily create) the shared async GREEN-API client"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+            timeout=10.0
+        )
+    return _async_client
+
+async def close_async_client():
+    """Close the shared async client on application shutdown"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
 class WhatsAppService:
     def __init__(self):
         self.green_api_id = os.getenv("GREEN_API_ID", "").strip()
@@ -18,6 +41,11 @@ class WhatsAppService:
         # Check if GREEN-API credentials are available
         self.green_api_enabled = bool(self.green_api_id and self.green_api_token)
         
+        # Circuit breaker for GREEN-API health probes
+        self.health_breaker = CircuitBreaker("green_api_health", fail_max=5, reset_timeout=30)
+        # Outbound sends fail fast (demo fallback) instead of waiting out the timeout while GREEN-API is down
+        self.send_breaker = CircuitBreaker("green_api_send", fail_max=5, reset_timeout=30)
+        
         # Debug environment variables
         self.check_environment_variables()  # Add this line
         
@@ -63,6 +91,40 @@ class WhatsAppService:
             # Fallback to demo mode
             return self._demo_send_message(to, message, "text")
     
+    async def send_text_message_async(self, to: str, message: str) -> Dict:
+        """Send text message using GREEN-API without blocking the event loop"""
+        if not self.green_api_enabled:
+            return self._demo_send_message(to, message, "text")
+        
+        if not self.send_breaker.allow_request():
+            return self._demo_send_message(to, message, "text")
+        
+        url = f"{self.green_api_url}/waInstance{self.green_api_id}/sendMessage/{self.green_api_token}"
+        
+        # Format phone number (remove + and spaces)
+        formatted_to = to.replace('+', '').replace(' ', '')
+        
+        payload = {
+            "chatId": f"{formatted_to}@c.us",
+            "message": message
+        }
+        
+        try:
+            logger.info(f"📤 Sending WhatsApp message to {formatted_to}")
+            response = await get_async_client().post(url, json=payload, timeout=30)
+            response.raise_for_status()
+            
+            result = response.json()
+            self.send_breaker.record_success()
+            logger.info(f"✅ Message sent successfully: {result.get('idMessage', 'Unknown')}")
+            return {"status": "sent", "green_api": True, "message_id": result.get('idMessage')}
+            
+        except (httpx.HTTPError, ValueError) as e:  # ValueError: a 2xx body that isn't JSON
+            self.send_breaker.record_failure()
+            logger.error(f"❌ GREEN-API Error: {e}")
+            # Fallback to demo mode
+            return self._demo_send_message(to, message, "text")
+    
     def send_buttons_message(self, to: str, message: str, buttons: List[Dict]) -> Dict:
         """Send message with buttons using GREEN-API"""
         if not self.green_api_enabled:
@@ -102,6 +164,43 @@ class WhatsAppService:
             logger.error(f"❌ GREEN-API Buttons Error: {e}")
             return self._demo_send_message(to, message, "buttons", buttons)
     
+    async def send_buttons_message_async(self, to: str, message: str, buttons: List[Dict]) -> Dict:
+        """Send message with buttons using GREEN-API without blocking the event loop"""
+        if not self.green_api_enabled or not self.send_breaker.allow_request():
+            return self._demo_send_message(to, message, "buttons", buttons)
+        
+        url = f"{self.green_api_url}/waInstance{self.green_api_id}/sendButtons/{self.green_api_token}"
+        
+        formatted_to = to.replace('+', '').replace(' ', '')
+        
+        payload = {
+            "chatId": f"{formatted_to}@c.us",
+            "message": message,
+            "buttons": [
+                {
+                    "buttonId": button.get('id', f'btn_{i+1}'),
+                    "buttonText": {"displayText": button.get('title', f'Button {i+1}')}
+                }
+                for i, button in enumerate(buttons[:3])  # Max 3 buttons
+            ],
+            "footer": "FoodExpress Pakistan 🍕"
+        }
+        
+        try:
+            logger.info(f"📤 Sending buttons message to {formatted_to}")
+            response = await get_async_client().post(url, json=payload, timeout=30)
+            response.raise_for_status()
+            
+            result = response.json()
+            self.send_breaker.record_success()
+            logger.info(f"✅ Buttons message sent: {result.get('idMessage', 'Unknown')}")
+            return {"status": "sent", "green_api": True, "message_id": result.get('idMessage')}
+            
+        except (httpx.HTTPError, ValueError) as e:  # ValueError: a 2xx body that isn't JSON
+            self.send_breaker.record_failure()
+            logger.error(f"❌ GREEN-API Buttons Error: {e}")
+            return self._demo_send_message(to, message, "buttons", buttons)
+    
     def send_image_message(self, to: str, image_url: str, caption: str = "") -> Dict:
         """Send image message using GREEN-API"""
         if not self.green_api_enabled:
@@ -290,15 +389,24 @@ Shukriya! FoodExpress Pakistan"""
         if not self.green_api_enabled:
             return {"status": "demo_mode", "message": "Running in DEMO mode"}
         
+        # Skip the network probe entirely while GREEN-API is known to be down
+        if not self.health_breaker.allow_request():
+            return {"status": "circuit_open", "green_api": False}
+        
         url = f"{self.green_api_url}/waInstance{self.green_api_id}/getStateInstance/{self.green_api_token}"
         
         try:
             response = requests.get(url, timeout=10)
             data = response.json()
+            self.health_breaker.record_success()
             return {
                 "status": "connected",
                 "whatsapp_state": data.get('stateInstance'),
                 "green_api": True
             }
         except Exception as e:
-            return {"status": "error", "message": str(e), "green_api": True}
\ No newline at end of file
+            self.health_breaker.record_failure()
+            return {"status": "error", "message": str(e), "green_api": True}
+
+# Global instance
+whatsapp_service = WhatsAppService()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import threading
+import time
+from typing import Any, Hashable, Optional
+
+# Menu version counter - bumped on every menu write so cached menu data keyed on it goes stale
+_menu_version = 0
+_menu_version_lock = threading.Lock()
+
+def get_menu_version() -> int:
+    """Get the current menu version"""
+    return _menu_version
+
+def bump_menu_version() -> int:
+    """Invalidate cached menu data after a menu write"""
+    global _menu_version
+    with _menu_version_lock:
+        _menu_version += 1
+        return _menu_version
+
+class TTLCache:
+    """Small thread-safe in-process cache with per-entry expiry"""
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 128):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            with self._lock:
+                self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value for ttl seconds"""
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                # Drop the oldest entry (dicts keep insertion order)
+                self._data.pop(next(iter(self._data)))
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def delete(self, key: Hashable):
+        """Drop a single entry if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove all cached entries"""
+        with self._lock:
+            self._data.clear()
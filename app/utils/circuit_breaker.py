@@ -0,0 +1,53 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Minimal circuit breaker: closed -> open after fail_max failures -> one half-open probe after reset_timeout"""
+
+    def __init__(self, name: str, fail_max: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current breaker state: closed, open or half_open"""
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        """Return False while the circuit is open; once half-open, admit a single probe"""
+        if self._opened_at is None:
+            return True
+        with self._lock:
+            state = self.state
+            if state == "half_open":
+                # Restamp so concurrent callers see the circuit open until the probe reports back
+                self._opened_at = time.monotonic()
+                return True
+            return state == "closed"
+
+    def record_success(self):
+        """Close the circuit after a successful call"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        """Count a failure and open the circuit once fail_max is reached"""
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.fail_max:
+                # A failed half-open probe re-opens the circuit for another reset_timeout
+                if self._opened_at is None:
+                    logger.warning("🔌 Circuit '%s' opened after %s failures", self.name, self._failures)
+                self._opened_at = time.monotonic()
@@ -0,0 +1,19 @@
+import math
+import numpy as np
+
+# Kilometres per degree of latitude, rounded down so the box never clips a point inside the radius
+KM_PER_DEGREE = 111.0
+
+def bounding_box_mask(lats: np.ndarray, lons: np.ndarray, lat: float, lon: float, radius_km: float) -> np.ndarray:
+    """Mask of points inside the lat/lon box enclosing radius_km around (lat, lon)
+
+    Only needs subtractions and comparisons, so it can reject far-away points before any haversine trig.
+    """
+    dlat_max = radius_km / KM_PER_DEGREE
+    mask = np.abs(lats - lat) <= dlat_max
+    # Longitude degrees shrink towards the poles - size the box at its poleward edge
+    cos_edge = math.cos(math.radians(min(abs(lat) + dlat_max, 90.0)))
+    if cos_edge > 1e-12:
+        dlon = np.abs((lons - lon + 180.0) % 360.0 - 180.0)
+        mask &= dlon <= radius_km / (KM_PER_DEGREE * cos_edge)
+    return mask
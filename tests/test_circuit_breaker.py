@@ -0,0 +1,61 @@
+import pytest
+
+from app.utils import circuit_breaker
+from app.utils.circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_fail_max_failures(clock):
+    breaker = CircuitBreaker("test", fail_max=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow_request()
+
+
+def test_half_open_admits_a_single_probe(clock):
+    breaker = CircuitBreaker("test", fail_max=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.state == "half_open"
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    assert breaker.state == "open"
+
+
+def test_probe_success_closes_the_circuit(clock):
+    breaker = CircuitBreaker("test", fail_max=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow_request()
+    assert breaker.allow_request()
+
+
+def test_probe_failure_reopens_for_another_timeout(clock):
+    breaker = CircuitBreaker("test", fail_max=1, reset_timeout=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow_request()
+
+    clock[0] += 5
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock[0] += 29
+    assert not breaker.allow_request()
+    clock[0] += 1
+    assert breaker.allow_request()
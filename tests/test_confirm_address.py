@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Base, User, Order, _apply_sqlite_pragmas
+from app.routers import webhook
+from app.services.order_service import OrderService
+
+PHONE = "923001234567"
+
+
+def make_sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'state.db'}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    Base.metadata.create_all(engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def test_wait_for_state_change_sees_other_session_commit(tmp_path):
+    Session = make_sessions(tmp_path)
+    with Session() as setup:
+        user = User(phone_number=PHONE)
+        setup.add(user)
+        setup.flush()
+        setup.add(Order(user_id=user.id, total_amount=500.0, status="pending", user_state="awaiting_location"))
+        setup.commit()
+
+    request_db = Session()
+    order_service = OrderService(request_db)
+    # confirm_address's session holds the order it loaded, so a plain re-query returns the cached state
+    loaded_order = request_db.query(Order).first()
+    assert order_service.get_user_state(PHONE) == "awaiting_location"
+
+    def confirm_from_other_session():
+        time.sleep(0.3)
+        with Session() as other:
+            other.query(Order).update({Order.user_state: "awaiting_confirmation"})
+            other.commit()
+
+    writer = threading.Thread(target=confirm_from_other_session)
+    writer.start()
+    started = time.monotonic()
+    state = asyncio.run(webhook._wait_for_state_change(order_service, PHONE, "awaiting_location", timeout=2.0))
+    elapsed = time.monotonic() - started
+    writer.join()
+    request_db.close()
+
+    assert state == "awaiting_confirmation"
+    assert loaded_order.user_state == "awaiting_confirmation"
+    assert elapsed < 1.5
@@ -0,0 +1,67 @@
+import pytest
+
+from app.services import location_service as location_module
+from app.services.location_service import LocationService
+
+
+class FakeLocation:
+    latitude = 24.92
+    longitude = 67.09
+    address = "Gulshan-e-Iqbal, Karachi, Pakistan"
+
+
+class FakeGeocoder:
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+
+    def geocode(self, query, exactly_one=True, timeout=None):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def clear_memory_caches():
+    location_module._geocode_cache.clear()
+    location_module._fallback_geocode_cache.clear()
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(location_module, "GEOCODE_CACHE_PATH", str(tmp_path / "geocode_cache.sqlite"))
+    monkeypatch.setattr(location_module, "_geocode_db", None)
+    clear_memory_caches()
+    yield LocationService()
+    if location_module._geocode_db is not None:
+        location_module._geocode_db.close()
+    clear_memory_caches()
+    location_module.geocode_breaker.record_success()
+
+
+def test_geocoder_hit_is_served_from_disk_after_restart(service):
+    service.geolocator = FakeGeocoder(result=FakeLocation())
+    assert service.geocode_address("Gulshan  e Iqbal, Karachi") == (24.92, 67.09, FakeLocation.address)
+
+    clear_memory_caches()  # as after a process restart
+    assert service.geocode_address("gulshan e iqbal, karachi") == (24.92, 67.09, FakeLocation.address)
+    assert service.geolocator.calls == 1
+
+
+def test_not_found_is_stored_as_a_negative_entry(service):
+    service.geolocator = FakeGeocoder(result=None)
+    first = service.geocode_address("Unknown Street, Lahore")
+    calls = service.geolocator.calls
+    assert first == (31.5204, 74.3587, "Lahore, Pakistan")
+    assert location_module._load_stored_geocode("unknown street, lahore") == (None, None, None)
+
+    clear_memory_caches()
+    assert service.geocode_address("Unknown Street, Lahore") == first
+    assert service.geolocator.calls == calls
+
+
+def test_geocoder_errors_are_not_persisted(service):
+    service.geolocator = FakeGeocoder(error=RuntimeError("timeout"))
+    assert service.geocode_address("Mall Road, Lahore") == (31.5204, 74.3587, "Lahore, Pakistan")
+    assert location_module._load_stored_geocode("mall road, lahore") is None
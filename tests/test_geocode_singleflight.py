@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import time
+
+from app.routers import webhook
+
+
+class SlowLocationService:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def geocode_address(self, address):
+        with self._lock:
+            self.calls += 1
+        time.sleep(0.1)  # keep the first lookup in flight while the second caller arrives
+        if self.error:
+            raise self.error
+        return 24.9, 67.1, "Gulshan, Karachi, Pakistan"
+
+
+async def geocode_concurrently(*addresses):
+    return await asyncio.gather(*(webhook._geocode(address) for address in addresses), return_exceptions=True)
+
+
+def test_concurrent_geocodes_of_one_address_share_a_lookup(monkeypatch):
+    location = SlowLocationService()
+    monkeypatch.setattr(webhook, "location_service", location)
+
+    results = asyncio.run(geocode_concurrently("Gulshan,  Karachi ", "gulshan, karachi"))
+
+    assert results == [(24.9, 67.1, "Gulshan, Karachi, Pakistan")] * 2
+    assert location.calls == 1
+    assert webhook._inflight_geocodes == {}
+
+
+def test_failed_geocode_reaches_every_waiter_and_clears_inflight(monkeypatch):
+    location = SlowLocationService(error=RuntimeError("geocoder down"))
+    monkeypatch.setattr(webhook, "location_service", location)
+
+    results = asyncio.run(geocode_concurrently("Gulshan, Karachi", "GULSHAN, KARACHI"))
+
+    assert location.calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert webhook._inflight_geocodes == {}
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+
+from app.routers import webhook
+
+
+class FakeWhatsAppService:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text_message_async(self, to_number, message):
+        self.sent.append((to_number, message))
+        return {"status": "demo"}
+
+
+class FakeLocationService:
+    def __init__(self):
+        self.geocoded = []
+
+    def geocode_address(self, address):
+        self.geocoded.append(address)
+        return 24.9, 67.1, "Gulshan, Karachi, Pakistan"
+
+    def get_nearby_options(self, lat, lon):
+        return [{"name": "FoodExpress Karachi", "type": "our_branch", "distance_km": 1.2}]
+
+
+class FakeOrderService:
+    def __init__(self, temp_location=None):
+        self.temp_location = temp_location
+        self.states = {}
+        self.saved_locations = []
+
+    def get_temporary_location(self, phone_number):
+        return self.temp_location
+
+    def get_user_state(self, phone_number):
+        return "new"
+
+    def update_user_state(self, phone_number, state):
+        self.states[phone_number] = state
+
+    def save_temporary_location(self, phone_number, lat, lon, address, options=None):
+        self.saved_locations.append((lat, lon, address))
+
+    def save_conversation(self, phone_number, role, message):
+        pass
+
+
+def run_search(monkeypatch, message_text, order_service=None):
+    whatsapp = FakeWhatsAppService()
+    location = FakeLocationService()
+    order_service = order_service or FakeOrderService()
+    monkeypatch.setattr(webhook, "whatsapp_service", whatsapp)
+    monkeypatch.setattr(webhook, "location_service", location)
+    asyncio.run(webhook.handle_nearby_search(message_text, "923001234567", whatsapp, location, order_service))
+    return whatsapp, location, order_service
+
+
+def test_nearby_search_without_radius_uses_default(monkeypatch, caplog):
+    caplog.set_level(logging.INFO, logger=webhook.logger.name)
+    whatsapp, location, order_service = run_search(monkeypatch, "nearby: Gulshan, Karachi")
+
+    assert location.geocoded == ["gulshan, karachi"]
+    assert "radius: 5.0 km" in caplog.text
+    assert "RESTAURANTS NEAR" in whatsapp.sent[0][1]
+    assert order_service.states["923001234567"] == "awaiting_restaurant_choice"
+
+
+def test_nearby_search_with_radius(monkeypatch, caplog):
+    caplog.set_level(logging.INFO, logger=webhook.logger.name)
+    whatsapp, location, _ = run_search(monkeypatch, "nearby: Gulshan, Karachi within 3 km")
+
+    assert location.geocoded == ["gulshan, karachi"]
+    assert "radius: 3.0 km" in caplog.text
+    assert "RESTAURANTS NEAR" in whatsapp.sent[0][1]
+
+
+def test_near_me_text_reuses_saved_location(monkeypatch):
+    whatsapp = FakeWhatsAppService()
+    location = FakeLocationService()
+    saved = {"lat": 31.52, "lon": 74.35, "address": "Liberty Market, Lahore"}
+    order_service = FakeOrderService(temp_location=saved)
+    monkeypatch.setattr(webhook, "whatsapp_service", whatsapp)
+    monkeypatch.setattr(webhook, "location_service", location)
+
+    message = {"from": "923001234567", "type": "text", "text": {"body": "pizza near me"}}
+    asyncio.run(webhook.handle_text_message(message, "923001234567", whatsapp, None, location, order_service))
+
+    assert location.geocoded == []
+    assert "RESTAURANTS NEAR Liberty Market, Lahore" in whatsapp.sent[0][1]
+    assert order_service.states["923001234567"] == "awaiting_restaurant_choice"